@@ -0,0 +1,83 @@
+"""Context-string builders for /query.
+
+Kept free of FastAPI/async code and fully annotated so the module can be
+compiled with mypyc (`mypyc app/api/formatting.py`) without changes; the
+interpreted module is used as-is otherwise.
+"""
+from decimal import Decimal
+from typing import List, Optional, Sequence, Union
+from app.db.models import Customer, Decision, EngineInput, RuleTrigger, SourceLimit
+
+NO_CODE_CONTEXT = "No relevant code found in repository."
+
+
+def as_float(value: Optional[Union[Decimal, float, int]]) -> Optional[float]:
+    """Numeric columns come back as Decimal; format them as plain floats."""
+    return float(value) if value is not None else None
+
+
+def format_code_context(paths: Sequence[str], contents: Sequence[str]) -> str:
+    parts: List[str] = [f"File: {path}\nContent:\n{content}" for path, content in zip(paths, contents)]
+    return "\n\n".join(parts) or NO_CODE_CONTEXT
+
+
+def format_customer(cust: Customer) -> str:
+    return f"Customer Found: {cust.full_name} (Risk Score: {cust.risk_score}, PEP: {cust.pep_flag}, Status: {cust.status})"
+
+
+def format_customer_missing(name: str) -> str:
+    return f"Customer '{name}' not found in DB."
+
+
+def format_customer_input(inp: EngineInput) -> str:
+    return (
+        f"  Engine Input #{inp.id}: Source={inp.source_system}, Amount={as_float(inp.amount)} {inp.currency}, "
+        f"Schema={inp.schema_code}, CardScore={inp.card_score}, ModelScore={inp.model_score}"
+    )
+
+
+def format_triggers(triggers: Sequence[RuleTrigger]) -> str:
+    return f"    Triggered Rules: {', '.join(t.rule_code for t in triggers)}"
+
+
+def format_decision(decision: Decision) -> str:
+    return f"    Decision: {decision.final_decision} (Action: {decision.action}, Combined Score: {decision.combined_score})"
+
+
+def format_source_limit(limit: SourceLimit) -> str:
+    return f"Source Limit Found: {limit.source_system} = {as_float(limit.limit_amount)}"
+
+
+def format_customer_list(customers: Sequence[Customer]) -> str:
+    lines: List[str] = [f"There are {len(customers)} customers:"]
+    lines.extend(f"- {c.full_name} (Risk Score: {c.risk_score}, PEP: {c.pep_flag}, Status: {c.status})" for c in customers)
+    return "\n".join(lines)
+
+
+def format_source_limit_list(limits: Sequence[SourceLimit]) -> str:
+    lines: List[str] = [f"There are {len(limits)} source limits:"]
+    lines.extend(f"- {limit.source_system}: {as_float(limit.limit_amount)}" for limit in limits)
+    return "\n".join(lines)
+
+
+def format_source_limit_missing(src: str) -> str:
+    return f"Source limit for '{src}' not found in DB."
+
+
+def format_rule_match(rule: str, match: RuleTrigger) -> str:
+    return f"  Rule {rule} triggered for Input #{match.input_id}"
+
+
+def format_rule_missing(rule: str) -> str:
+    return f"No triggers found for rule '{rule}'."
+
+
+def format_engine_input(engine_input: EngineInput) -> str:
+    return (
+        f"Engine Input #{engine_input.id}: Customer={engine_input.customer_id}, "
+        f"Source={engine_input.source_system}, Amount={as_float(engine_input.amount)}"
+    )
+
+
+def format_engine_input_missing(input_id: int) -> str:
+    return f"Input #{input_id} not found"
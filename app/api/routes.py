@@ -1,19 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, AsyncIterator, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 import time
-import json
+import orjson
 import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
 
-from app.db.session import get_db
+from app.api import formatting as fmt
+from app.db.session import get_db, AsyncSessionLocal
 from app.db.repositories import DataRepository
+from app.db.customer_index import CustomerNameIndex, customer_index
 from app.llm.registry import registry
 from app.github.retriever import GitHubRepoRetriever
 from app.retrievers.local_retriever import LocalRepoRetriever
-from app.chains.query_chain import get_query_chain, get_extraction_chain, get_streaming_query_chain
+from app.chains.query_chain import (
+    get_chain,
+    cached_extract,
+    classify_shallow,
+    fast_extract,
+    needs_llm_extraction,
+)
+from app.chains.semantic_cache import answer_cache
 from app.config import settings
+from app.utils.cache import TTLCache, text_key
 from app.utils.logger import get_logger, log_query_analytics
 
 logger = get_logger(__name__)
@@ -30,132 +42,238 @@ class QueryResponse(BaseModel):
     reasoning: Optional[Any] = None
     model_id: str
 
+# Retrievers are reused across requests (keyed by whether a GitHub token is configured)
+_retrievers: dict = {}
+
+
+def get_retriever():
+    """Return the shared retriever: GitHub when a token is configured, local repo otherwise."""
+    use_github = bool(settings.GITHUB_TOKEN)
+    retriever = _retrievers.get(use_github)
+    if retriever is None:
+        if use_github:
+            retriever = GitHubRepoRetriever()
+        else:
+            logger.warning("No GitHub token configured, using LocalRepoRetriever")
+            retriever = LocalRepoRetriever()
+        _retrievers[use_github] = retriever
+    return retriever
+
+
+async def close_retrievers() -> None:
+    for retriever in _retrievers.values():
+        aclose = getattr(retriever, "aclose", None)
+        if aclose:
+            await aclose()
+    _retrievers.clear()
+
+
+_retrieval_cache = TTLCache(maxsize=256, ttl=settings.RETRIEVAL_CACHE_TTL)
+
+
+def _uses_intent(retriever) -> bool:
+    return getattr(retriever, "uses_intent", True)
+
+
+async def _retrieve_cached(retriever, query: str, intent: str) -> List[Any]:
+    """Retrieve code snippets, reusing results for the same retriever target, query and intent."""
+    target = str(getattr(retriever, "repo", None) or getattr(retriever, "repo_path", ""))
+    key = (type(retriever).__name__, target, intent if _uses_intent(retriever) else None, text_key(query))
+    snippets = _retrieval_cache.get(key)
+    if snippets is None:
+        snippets = await retriever.retrieve_logic_snippets(query, intent=intent)
+        _retrieval_cache.set(key, snippets)
+    return list(snippets)
+
+
+async def _resolve_customers(names: List[str], name_index: CustomerNameIndex) -> List[Any]:
+    """Resolve extracted names to customers, in the same order as `names`.
+
+    Names found by the customer index load with one batched id query; names
+    the index does not know (e.g. from LLM extraction) fall back to ILIKE.
+    """
+    indexed_ids = {name: name_index.ids_for(name) for name in names}
+    ids = sorted({ids[0] for ids in indexed_ids.values() if ids})
+    unknown = [name for name in names if not indexed_ids[name]]
+    by_id, fuzzy = await asyncio.gather(
+        _isolated_lookup(DataRepository.get_customers_by_ids, ids) if ids else _noop(),
+        asyncio.gather(*[_isolated_lookup(DataRepository.get_customer_by_name, name) for name in unknown]),
+    )
+    customers_by_id = {cust.id: cust for cust in by_id or []}
+    fuzzy_by_name = dict(zip(unknown, fuzzy))
+    return [
+        customers_by_id.get(indexed_ids[name][0]) if indexed_ids[name] else fuzzy_by_name[name]
+        for name in names
+    ]
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    # Compression middleware would buffer the stream; mark it as already encoded
+    "Content-Encoding": "identity"
+}
+
+
+def _sse_event(payload: dict) -> bytes:
+    """Encode one Server-Sent Event; bytes skip Starlette's per-chunk str encode."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def _noop():
+    return None
+
+
+async def _isolated_lookup(method, *args):
+    """Run a DataRepository lookup on its own session.
+
+    An AsyncSession does not allow concurrent operations, so lookups that are
+    gathered together each check out a separate pooled connection.
+    """
+    async with AsyncSessionLocal() as session:
+        return await method(DataRepository(session), *args)
+
+
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 @router.get("/models")
 async def list_models():
+    await registry.refresh_ollama_models()
     return registry.list_models()
 
-@router.post("/query", response_model=QueryResponse)
-async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db)):
-    start_time = time.time()
-    logger.info(f"Query received: '{request.query[:80]}...'" if len(request.query) > 80 else f"Query received: '{request.query}'")
-    
-    # 1. Determine Model
-    model_id = request.model_id
-    if not model_id:
-        # Pick first available or default to OpenRouter if available
-        models = registry.list_models()
-        if not models:
-            raise HTTPException(status_code=500, detail="No LLM models configured.")
-        openrouter_model = next((m for m in models if m["provider"] == "openrouter"), None)
-        model_id = openrouter_model["id"] if openrouter_model else models[0]["id"]
-    
-    logger.info(f"Using model: {model_id}")
+@router.post("/admin/reload-models")
+async def reload_models():
+    await registry.reload()
+    return registry.list_models()
 
-    # 2. Retrieve Logic (Hybrid Strategy)
-    active_retriever = None
-    snippets: List[Any] = []
+@dataclass
+class QueryContext:
+    """Inputs for the summary chain plus the counts reported back to the client."""
+    snippets: List[Any]
+    code_context: str
+    db_context: str
+    db_entities_found: int
+    extracted: Optional[dict]
 
-    if settings.GITHUB_TOKEN:
-        active_retriever = GitHubRepoRetriever()
-        snippets = await active_retriever.retrieve_logic_snippets(request.query, intent="general_query")
-    else:
-        logger.warning("No GitHub token configured, using LocalRepoRetriever")
-        active_retriever = LocalRepoRetriever()
-        snippets = await active_retriever.retrieve_logic_snippets(request.query, intent="general_query")
 
-    logger.info(f"Code retrieval: {len(snippets)} snippets found - Files: {[s.path for s in snippets]}")
+async def _extract_entities(query: str, model_id: str, repo: DataRepository) -> Optional[dict]:
+    try:
+        # Extract entities to query DB (regex fast path, LLM only when it finds nothing)
+        name_index = await customer_index.ensure_fresh(repo)
+        extracted = fast_extract(query, name_index.pattern)
+        if needs_llm_extraction(extracted, query):
+            logger.info("Fast extraction found no entities, falling back to LLM extraction")
+            extracted = await cached_extract(query, model_id)
+        return extracted
+    except Exception as e:
+        logger.error(f"Entity extraction failed: {e}")
+        return None
+
 
-    code_context = "\n\n".join([f"File: {s.path}\nContent:\n{s.content}" for s in snippets]) or "No relevant code found in repository."
+async def _retrieve_code(retriever, query: str, intent: str) -> List[Any]:
+    # Retrieve Logic (Hybrid Strategy) with the extracted intent
+    snippets: List[Any] = await _retrieve_cached(retriever, query, intent)
+    logger.info(f"Code retrieval ({intent}): {len(snippets)} snippets found - Files: {[s.path for s in snippets]}")
+    return snippets
 
-    # 3. DB Interaction (Phase 1 with Intent-Based Extraction)
-    repo = DataRepository(db)
+
+async def _lookup_db_context(extracted: Optional[dict], repo: DataRepository) -> Tuple[str, int]:
+    """Build the DB context string for the extracted entities; returns (db_context, entities_found)."""
     db_context_parts = []
     db_entities_found = 0
-    
-    try:
-        # Extract entities to query DB (uses LLM to identify customer names, rule codes, etc.)
-        extraction_chain = get_extraction_chain(model_id)
-        extracted = await extraction_chain.ainvoke({"query": request.query})
-        
-        # Re-search repository with intent if needed
-        intent = extracted.get('intent', 'general_query')
-        if intent != 'general_query':
-            # Re-run retrieval with specific intent for better results
-            logger.info(f"Re-searching with intent: {intent}")
-            snippets = await active_retriever.retrieve_logic_snippets(request.query, intent=intent)
-            code_context = "\n\n".join([f"File: {s.path}\nContent:\n{s.content}" for s in snippets]) or "No relevant code found in repository."
-        
-        # Search Customers
-        for name in extracted.get("customer_names", []):
-            cust = await repo.get_customer_by_name(name)
-            if cust:
-                db_entities_found += 1
-                result_msg = f"Customer Found: {cust.full_name} (Risk Score: {cust.risk_score}, PEP: {cust.pep_flag}, Status: {cust.status})"
-                db_context_parts.append(result_msg)
-                
-                inputs = await repo.get_engine_inputs_by_customer(cust.id)
-                if inputs:
-                    for inp in inputs:
+
+    db_lookup_ok = False
+    if extracted is not None:
+        try:
+            # Independent lookups run concurrently, each on its own pooled session
+            customer_names = extracted.get("customer_names", [])
+            source_systems = extracted.get("source_systems", [])
+            rule_codes = extracted.get("rule_codes", [])
+            input_id = extracted.get("input_id")
+            customers, limits, rule_matches, engine_input = await asyncio.gather(
+                _resolve_customers(customer_names, customer_index),
+                _isolated_lookup(DataRepository.get_source_limits, source_systems),
+                _isolated_lookup(DataRepository.search_by_rule_codes, rule_codes),
+                _isolated_lookup(DataRepository.get_engine_input_by_id, input_id) if input_id else _noop(),
+            )
+
+            # Search Customers (batch-load related rows for all matched customers)
+            customer_ids = list({cust.id for cust in customers if cust})
+            inputs_by_customer = defaultdict(list)
+            for inp in await repo.get_engine_inputs_for_customers(customer_ids):
+                inputs_by_customer[inp.customer_id].append(inp)
+
+            input_ids = [inp.id for inputs in inputs_by_customer.values() for inp in inputs]
+            triggers, decisions = await asyncio.gather(
+                _isolated_lookup(DataRepository.get_triggers_for_inputs, input_ids),
+                _isolated_lookup(DataRepository.get_decisions_for_inputs, input_ids),
+            )
+            triggers_by_input = defaultdict(list)
+            for trigger in triggers:
+                triggers_by_input[trigger.input_id].append(trigger)
+            decision_by_input = {}
+            for decision in decisions:
+                decision_by_input.setdefault(decision.input_id, decision)
+
+            for name, cust in zip(customer_names, customers):
+                if cust:
+                    db_entities_found += 1
+                    db_context_parts.append(fmt.format_customer(cust))
+
+                    for inp in inputs_by_customer.get(cust.id, []):
                         db_entities_found += 1
-                        inp_msg = f"  Engine Input #{inp.id}: Source={inp.source_system}, Amount={inp.amount} {inp.currency}, Schema={inp.schema_code}, CardScore={inp.card_score}, ModelScore={inp.model_score}"
-                        db_context_parts.append(inp_msg)
-                        
-                        triggers = await repo.get_rule_triggers_by_input(inp.id)
+                        db_context_parts.append(fmt.format_customer_input(inp))
+
+                        triggers = triggers_by_input.get(inp.id)
                         if triggers:
-                            trigger_codes = [t.rule_code for t in triggers]
-                            trigger_msg = f"    Triggered Rules: {', '.join(trigger_codes)}"
-                            db_context_parts.append(trigger_msg)
-                        
-                        decision = await repo.get_decision_by_input(inp.id)
+                            db_context_parts.append(fmt.format_triggers(triggers))
+
+                        decision = decision_by_input.get(inp.id)
                         if decision:
-                            dec_msg = f"    Decision: {decision.final_decision} (Action: {decision.action}, Combined Score: {decision.combined_score})"
-                            db_context_parts.append(dec_msg)
-            else:
-                result_msg = f"Customer '{name}' not found in DB."
-                db_context_parts.append(result_msg)
-
-        # Search Source Limits
-        for src in extracted.get("source_systems", []):
-            limit = await repo.get_source_limit(src)
-            if limit:
-                db_entities_found += 1
-                result_msg = f"Source Limit Found: {limit.source_system} = {limit.limit_amount}"
-                db_context_parts.append(result_msg)
-            else:
-                result_msg = f"Source limit for '{src}' not found in DB."
-                db_context_parts.append(result_msg)
-
-        # Search by Rule Code
-        for rule in extracted.get("rule_codes", []):
-            matches = await repo.search_by_rule_code(rule)
-            if matches:
-                db_entities_found += len(matches)
-                for match in matches:
-                    rule_msg = f"  Rule {rule} triggered for Input #{match.input_id}"
-                    db_context_parts.append(rule_msg)
-            else:
-                result_msg = f"No triggers found for rule '{rule}'."
-                db_context_parts.append(result_msg)
+                            db_context_parts.append(fmt.format_decision(decision))
+                else:
+                    db_context_parts.append(fmt.format_customer_missing(name))
+
+            # Search Source Limits
+            limit_by_source = {limit.source_system: limit for limit in limits}
+            for src in source_systems:
+                limit = limit_by_source.get(src)
+                if limit:
+                    db_entities_found += 1
+                    db_context_parts.append(fmt.format_source_limit(limit))
+                else:
+                    db_context_parts.append(fmt.format_source_limit_missing(src))
+
+            # Search by Rule Code
+            matches_by_rule = defaultdict(list)
+            for match in rule_matches:
+                matches_by_rule[match.rule_code].append(match)
+            for rule in rule_codes:
+                matches = matches_by_rule.get(rule)
+                if matches:
+                    db_entities_found += len(matches)
+                    for match in matches:
+                        db_context_parts.append(fmt.format_rule_match(rule, match))
+                else:
+                    db_context_parts.append(fmt.format_rule_missing(rule))
         
-        # If input_id is specified, fetch that specific input
-        if extracted.get("input_id"):
-            input_id = extracted["input_id"]
-            engine_input = await repo.get_engine_input_by_id(input_id)
-            if engine_input:
-                db_entities_found += 1
-                inp_msg = f"Engine Input #{engine_input.id}: Customer={engine_input.customer_id}, Source={engine_input.source_system}, Amount={engine_input.amount}"
-                db_context_parts.append(inp_msg)
-            else:
-                db_context_parts.append(f"Input #{input_id} not found")
+            # If input_id is specified, report that specific input
+            if input_id:
+                if engine_input:
+                    db_entities_found += 1
+                    db_context_parts.append(fmt.format_engine_input(engine_input))
+                else:
+                    db_context_parts.append(fmt.format_engine_input_missing(input_id))
         
-        logger.info(f"Database lookup: {db_entities_found} entities found")
+            logger.info(f"Database lookup: {db_entities_found} entities found")
 
-    except Exception as e:
-        logger.error(f"Entity extraction failed: {e}")
+            db_lookup_ok = True
+        except Exception as e:
+            logger.error(f"Database lookup failed: {e}")
+    if not db_lookup_ok:
         # Fallback: just list all customers and limits
         customers = await repo.get_all_customers()
         limits = await repo.get_all_source_limits()
@@ -164,30 +282,101 @@ async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db)):
     db_context = "\n".join(db_context_parts)
     if not db_context:
         db_context = "No relevant data found in DB."
+    return db_context, db_entities_found
+
+
+async def build_query_context(
+    query: str, model_id: str, repo: DataRepository
+) -> AsyncIterator[Union[dict, QueryContext]]:
+    """Extract entities, then run code retrieval and DB lookups concurrently.
+
+    Retrieval runs exactly once: after extraction when the retriever uses the
+    intent, alongside extraction when it does not.
+
+    Yields a `db_progress` event as each phase finishes and the QueryContext last,
+    so the streaming endpoint can forward progress while the context is built.
+    """
+    retriever = get_retriever()
+    retrieval = None
+    if not _uses_intent(retriever):
+        retrieval = asyncio.create_task(_retrieve_code(retriever, query, "general_query"))
+    pending = {retrieval} if retrieval else set()
+    try:
+        extracted = await _extract_entities(query, model_id, repo)
+        intent = extracted.get("intent", "general_query") if extracted else "general_query"
+        yield {"type": "db_progress", "stage": "extraction", "intent": intent}
+
+        if retrieval is None:
+            retrieval = asyncio.create_task(_retrieve_code(retriever, query, intent))
+        db_lookup = asyncio.create_task(_lookup_db_context(extracted, repo))
+        pending = {retrieval, db_lookup}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is retrieval:
+                    yield {"type": "db_progress", "stage": "retrieval", "code_snippets_count": len(task.result())}
+                else:
+                    yield {"type": "db_progress", "stage": "database", "db_entities_found": task.result()[1]}
+    finally:
+        for task in pending:
+            task.cancel()
+
+    snippets = retrieval.result()
+    db_context, db_entities_found = db_lookup.result()
+    yield QueryContext(
+        snippets=snippets,
+        code_context=fmt.format_code_context([s.path for s in snippets], [s.content for s in snippets]),
+        db_context=db_context,
+        db_entities_found=db_entities_found,
+        extracted=extracted,
+    )
+
+
+@router.post("/query", response_model=QueryResponse)
+async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db)):
+    start_time = time.time()
+    logger.info(f"Query received: '{request.query[:80]}...'" if len(request.query) > 80 else f"Query received: '{request.query}'")
     
-    # 4. Check if streaming is requested
+    # 1. Determine Model
+    # Default: OpenRouter if available, else first configured model
+    model_id = request.model_id or registry.default_model_id()
+    if not model_id:
+        raise HTTPException(status_code=500, detail="No LLM models configured.")
+    
+    logger.info(f"Using model: {model_id}")
+
+    # Plain listing queries skip retrieval, extraction and the LLM entirely
+    shallow_kind = classify_shallow(request.query)
+    if shallow_kind:
+        return await handle_shallow_query(request, shallow_kind, model_id, DataRepository(db), start_time)
+
+    # 2. Streaming responds right away and builds the context inside the stream
     if request.stream:
         logger.info("Streaming mode enabled")
-        return await handle_streaming_query(
-            request=request,
-            model_id=model_id,
-            code_context=code_context,
-            db_context=db_context,
-            snippets=snippets,
-            db_entities_found=db_entities_found,
-            extracted=extracted if 'extracted' in locals() else {},
-            start_time=start_time
-        )
+        return await handle_streaming_query(request=request, model_id=model_id, start_time=start_time)
+
+    # 3. Entity extraction, then code retrieval + DB lookups (Phase 1 with Intent-Based Extraction)
+    ctx = None
+    async for item in build_query_context(request.query, model_id, DataRepository(db)):
+        if isinstance(item, QueryContext):
+            ctx = item
+    snippets, code_context, db_context = ctx.snippets, ctx.code_context, ctx.db_context
+    db_entities_found, extracted = ctx.db_entities_found, ctx.extracted
     
-    # 5. Run Chain (Non-Streaming)
+    # 4. Run Chain (Non-Streaming)
     logger.info("Non-streaming mode (standard JSON response)")
     try:
-        chain = get_query_chain(model_id)
-        answer = await chain.ainvoke({
-            "query": request.query,
-            "code_context": code_context,
-            "db_context": db_context
-        })
+        cache_key = answer_cache.context_key(model_id, code_context, db_context)
+        answer = await answer_cache.lookup(request.query, cache_key) if settings.SEMANTIC_CACHE_ENABLED else None
+        if answer is None:
+            chain = get_chain(model_id)
+            answer = await chain.ainvoke({
+                "query": request.query,
+                "code_context": code_context,
+                "db_context": db_context
+            })
+            if settings.SEMANTIC_CACHE_ENABLED:
+                await answer_cache.store(request.query, cache_key, answer)
         
         response_time_ms = (time.time() - start_time) * 1000
         logger.info(f"Query completed successfully - Response time: {response_time_ms:.2f}ms")
@@ -223,7 +412,7 @@ async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db)):
         reasoning={
             "code_snippets_count": len(snippets),
             "db_context_summary": db_context,
-            "extracted_entities": extracted if 'extracted' in locals() else None
+            "extracted_entities": extracted
         },
         model_id=model_id
     )
@@ -232,44 +421,70 @@ async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db)):
 async def handle_streaming_query(
     request: QueryRequest,
     model_id: str,
-    code_context: str,
-    db_context: str,
-    snippets: List[Any],
-    db_entities_found: int,
-    extracted: dict,
     start_time: float
 ):
-    """Handle streaming response using Server-Sent Events format."""
+    """Handle streaming response using Server-Sent Events format.
+
+    The first event goes out before any work starts; `db_progress` events follow
+    as extraction, retrieval and DB lookups finish, then a full metadata event
+    and the LLM content.
+    """
     
     async def event_generator():
+        snippets: List[Any] = []
+        db_entities_found = 0
         try:
-            # Send initial metadata
+            yield _sse_event({"type": "metadata", "model_id": model_id})
+
+            # The stream outlives the request-scoped session, so it opens its own
+            ctx = None
+            async with AsyncSessionLocal() as session:
+                async for item in build_query_context(request.query, model_id, DataRepository(session)):
+                    if isinstance(item, QueryContext):
+                        ctx = item
+                    else:
+                        yield _sse_event(item)
+            snippets, code_context, db_context = ctx.snippets, ctx.code_context, ctx.db_context
+            db_entities_found = ctx.db_entities_found
+
+            # Send full metadata now that the context is known
             metadata = {
                 "type": "metadata",
                 "model_id": model_id,
                 "code_snippets_count": len(snippets),
                 "db_entities_found": db_entities_found,
-                "extracted_entities": extracted
+                "extracted_entities": ctx.extracted or {}
             }
-            yield f"data: {json.dumps(metadata)}\n\n"
+            yield _sse_event(metadata)
             
-            # Get streaming chain
-            chain = get_streaming_query_chain(model_id)
-            
-            # Stream the response
+            cache_key = answer_cache.context_key(model_id, code_context, db_context)
+            cached_answer = await answer_cache.lookup(request.query, cache_key) if settings.SEMANTIC_CACHE_ENABLED else None
+
             chunk_count = 0
-            async for chunk in chain.astream({
-                "query": request.query,
-                "code_context": code_context,
-                "db_context": db_context
-            }):
-                chunk_count += 1
-                chunk_data = {
-                    "type": "content",
-                    "content": chunk
-                }
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-                await asyncio.sleep(0)  # Allow other tasks to run
+            if cached_answer is not None:
+                # Cache hit: send the whole answer as a single content event
+                chunk_count = 1
+                yield _sse_event({'type': 'content', 'content': cached_answer})
+            else:
+                chain = get_chain(model_id)
+                
+                # Stream the response
+                answer_parts = []
+                async for chunk in chain.astream({
+                    "query": request.query,
+                    "code_context": code_context,
+                    "db_context": db_context
+                }):
+                    chunk_count += 1
+                    answer_parts.append(chunk)
+                    chunk_data = {
+                        "type": "content",
+                        "content": chunk
+                    }
+                    yield _sse_event(chunk_data)
+                
+                if settings.SEMANTIC_CACHE_ENABLED:
+                    await answer_cache.store(request.query, cache_key, "".join(answer_parts))
             
             # Send completion message
             response_time_ms = (time.time() - start_time) * 1000
@@ -278,7 +493,7 @@ async def handle_streaming_query(
                 "response_time_ms": response_time_ms,
                 "chunks_sent": chunk_count
             }
-            yield f"data: {json.dumps(completion_data)}\n\n"
+            yield _sse_event(completion_data)
             
             logger.info(f"Streaming completed - Response time: {response_time_ms:.2f}ms, Chunks: {chunk_count}")
             
@@ -300,7 +515,7 @@ async def handle_streaming_query(
                 "type": "error",
                 "error": str(e)
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield _sse_event(error_data)
             
             log_query_analytics(
                 query=request.query,
@@ -315,9 +530,57 @@ async def handle_streaming_query(
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+        headers=SSE_HEADERS
+    )
+
+
+async def handle_shallow_query(
+    request: QueryRequest,
+    kind: str,
+    model_id: str,
+    repo: DataRepository,
+    start_time: float
+):
+    """Answer a listing query (see classify_shallow) with a templated answer built from the DB."""
+    if kind == "list_customers":
+        rows = await repo.get_all_customers()
+        answer = fmt.format_customer_list(rows)
+    else:
+        rows = await repo.get_all_source_limits()
+        answer = fmt.format_source_limit_list(rows)
+
+    response_time_ms = (time.time() - start_time) * 1000
+    logger.info(f"Shallow query ({kind}) answered from DB - Response time: {response_time_ms:.2f}ms")
+    log_query_analytics(
+        query=request.query,
+        model_id=model_id,
+        code_snippets_count=0,
+        db_entities_found=len(rows),
+        response_time_ms=response_time_ms,
+        success=True
+    )
+
+    extracted = {"intent": kind}
+    if request.stream:
+        events = [
+            _sse_event({
+                "type": "metadata",
+                "model_id": model_id,
+                "code_snippets_count": 0,
+                "db_entities_found": len(rows),
+                "extracted_entities": extracted
+            }),
+            _sse_event({"type": "content", "content": answer}),
+            _sse_event({"type": "done", "response_time_ms": response_time_ms, "chunks_sent": 1}),
+        ]
+        return StreamingResponse(iter(events), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    return QueryResponse(
+        answer=answer,
+        reasoning={
+            "code_snippets_count": 0,
+            "db_context_summary": answer,
+            "extracted_entities": extracted
+        },
+        model_id=model_id
     )
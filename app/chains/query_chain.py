@@ -2,8 +2,12 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Iterable, List, Optional, Pattern
+from functools import lru_cache
+import re
+from app.config import settings
 from app.llm.factory import get_llm
+from app.utils.cache import TTLCache, text_key
 
 # --- Extraction Chain ---
 class ExtractionResult(BaseModel):
@@ -44,6 +48,7 @@ User Query: {query}
 Return valid JSON matching the schema.
 """)
 
+@lru_cache(maxsize=32)
 def get_extraction_chain(model_id: str):
     llm = get_llm(model_id)
     parser = JsonOutputParser(pydantic_object=ExtractionResult)
@@ -55,6 +60,115 @@ def get_extraction_chain(model_id: str):
     )
     return chain
 
+
+# Bump when ExtractionResult or extraction_prompt changes so cached results are not reused
+EXTRACTION_SCHEMA_VERSION = 1
+
+_extraction_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+async def cached_extract(query: str, model_id: str) -> dict:
+    """Run the LLM extraction chain, reusing results for identical queries for five minutes."""
+    key = text_key(str(EXTRACTION_SCHEMA_VERSION), model_id, query)
+    hit = _extraction_cache.get(key)
+    if hit is not None:
+        return dict(hit)
+
+    extracted = await get_extraction_chain(model_id).ainvoke({"query": query})
+    _extraction_cache.set(key, extracted)
+    return dict(extracted)
+
+# --- Fast (regex) Extraction ---
+SOURCE_SYSTEM_RE = re.compile(r"\bSRC[0-9X]+\b", re.IGNORECASE)
+RULE_CODE_RE = re.compile(r"\bR\d{3}\b", re.IGNORECASE)
+SCHEMA_CODE_RE = re.compile(r"\bDUMMY[A-Z]+\b", re.IGNORECASE)
+AMOUNT_RE = re.compile(r"\b(\d+(?:\.\d+)?)\s?(USD|EUR|GBP)\b", re.IGNORECASE)
+INPUT_ID_RE = re.compile(r"\binput\s*(?:id)?\s*#?\s*(\d+)\b", re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z]+")
+
+EXPLAIN_WORDS = frozenset({"why", "explain", "justify", "reason"})
+SIMULATE_WORDS = frozenset({"simulate", "simulation", "sending", "send", "hypothetical"})
+LIMIT_WORDS = frozenset({"limit", "limits"})
+ACTION_WORDS = frozenset({"action", "actions"})
+
+
+def _unique_upper(matches: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(m.upper() for m in matches))
+
+
+def _classify_intent(words: set, has_rules: bool, has_sources: bool) -> str:
+    if words & SIMULATE_WORDS:
+        return "simulate_decision"
+    if words & LIMIT_WORDS:
+        return "check_limit"
+    if words & EXPLAIN_WORDS:
+        return "action_justification" if words & ACTION_WORDS else "explain_rule"
+    if has_rules:
+        return "explain_rule"
+    if has_sources:
+        return "check_limit"
+    return "general_query"
+
+
+def fast_extract(query: str, name_pattern: Optional[Pattern] = None) -> dict:
+    """Deterministic regex extraction returning the ExtractionResult shape.
+
+    Covers the structured identifiers (source systems, rule codes, schema
+    codes, amounts, input ids) plus customer names known to the database,
+    so most queries never need the LLM extraction chain.
+    """
+    words = set(WORD_RE.findall(query.lower()))
+    source_systems = _unique_upper(SOURCE_SYSTEM_RE.findall(query))
+    rule_codes = _unique_upper(RULE_CODE_RE.findall(query))
+    schema_codes = _unique_upper(SCHEMA_CODE_RE.findall(query))
+    amount_match = AMOUNT_RE.search(query)
+    input_match = INPUT_ID_RE.search(query)
+    customer_names = list(dict.fromkeys(m.group(0) for m in name_pattern.finditer(query))) if name_pattern else []
+
+    return {
+        "intent": _classify_intent(words, bool(rule_codes), bool(source_systems)),
+        "customer_names": customer_names,
+        "source_systems": source_systems,
+        "rule_codes": rule_codes,
+        "amount": float(amount_match.group(1)) if amount_match else None,
+        "currency": amount_match.group(2).upper() if amount_match else None,
+        "schema_code": schema_codes[0] if schema_codes else None,
+        "input_id": int(input_match.group(1)) if input_match else None,
+        "needs_explanation": bool(words & EXPLAIN_WORDS),
+    }
+
+
+def needs_llm_extraction(extracted: dict, query: str) -> bool:
+    """True when the fast path found nothing and the query is long enough to hide entities."""
+    found_any = any(
+        extracted.get(key)
+        for key in ("customer_names", "source_systems", "rule_codes", "schema_code", "amount", "input_id")
+    )
+    return not found_any and len(query) > settings.EXTRACTION_LLM_MIN_QUERY_LEN
+
+
+# --- Shallow Queries (answered from the DB alone) ---
+_LIST_PREFIX = r"^(?:please\s+)?(?:list|show(?:\s+me)?|display|get|what|which|who)(?:\s+are)?(?:\s+all)?(?:\s+(?:of\s+)?the)?\s+"
+_LIST_SUFFIX = r"(?:\s+(?:are\s+there|do\s+we\s+have|exist))?\s*[?.!]*$"
+
+SHALLOW_QUERIES = (
+    ("list_customers", re.compile(_LIST_PREFIX + r"(?:customers|clients)" + _LIST_SUFFIX, re.IGNORECASE)),
+    ("list_limits", re.compile(_LIST_PREFIX + r"(?:source\s+systems|sources|source\s+limits|limits)" + _LIST_SUFFIX, re.IGNORECASE)),
+)
+
+
+def classify_shallow(query: str) -> Optional[str]:
+    """Return "list_customers" / "list_limits" for plain listing questions, else None.
+
+    Patterns are anchored on the whole query, so anything naming an entity or
+    asking more than "what X are there" goes through the full pipeline.
+    """
+    query = query.strip()
+    for kind, pattern in SHALLOW_QUERIES:
+        if pattern.match(query):
+            return kind
+    return None
+
 # --- Summary Chain ---
 summary_prompt = ChatPromptTemplate.from_template("""You are an AI assistant for a decisioning engine system.
 The system evaluates requests through rules, scoring calculations, and action derivations.
@@ -81,20 +195,9 @@ Provide a clear, detailed answer that:
 Be concise but thorough.
 """)
 
-def get_query_chain(model_id: str):
-    llm = get_llm(model_id)
-    
-    chain = (
-        summary_prompt 
-        | llm 
-        | StrOutputParser()
-    )
-    
-    return chain
-
-
-def get_streaming_query_chain(model_id: str):
-    """Return a chain configured for streaming responses."""
+@lru_cache(maxsize=16)
+def get_chain(model_id: str):
+    """Return the summary chain for a model; use .ainvoke for JSON and .astream for SSE."""
     llm = get_llm(model_id)
     
     chain = (
@@ -0,0 +1,78 @@
+"""In-process semantic cache for final LLM answers.
+
+Answers are stored per context key (model + hash of code/DB context) together
+with the query embedding. A later query hits when its context key matches and
+its embedding is within SEMANTIC_CACHE_THRESHOLD cosine similarity, so stale
+contexts never return an old answer.
+"""
+from __future__ import annotations
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.llm.embeddings import get_query_embedding
+from app.llm.scoring import cosine_topk
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (embedding, answer, expires_at)
+CacheEntry = Tuple[np.ndarray, str, float]
+
+MAX_ANSWERS_PER_CONTEXT = 32
+
+
+class SemanticCache:
+    """LRU of context keys, each holding the answers given under that context."""
+
+    def __init__(self, threshold: float, ttl: int, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[CacheEntry]]" = OrderedDict()
+
+    @staticmethod
+    def context_key(model_id: str, code_context: str, db_context: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for part in (model_id, code_context, db_context):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    async def lookup(self, query: str, context_key: str) -> Optional[str]:
+        bucket = self._entries.get(context_key)
+        if not bucket:
+            return None
+        now = time.monotonic()
+        bucket[:] = [e for e in bucket if e[2] > now]
+        if not bucket:
+            del self._entries[context_key]
+            return None
+
+        embedding = await get_query_embedding(query)
+        idx, scores = cosine_topk(np.stack([e[0] for e in bucket]), embedding, 1)
+        best_score = float(scores[0])
+        if best_score >= self.threshold:
+            self._entries.move_to_end(context_key)
+            logger.info(f"Semantic cache hit (similarity={best_score:.3f})")
+            return bucket[int(idx[0])][1]
+        return None
+
+    async def store(self, query: str, context_key: str, answer: str) -> None:
+        embedding = await get_query_embedding(query)
+        entry = (embedding, answer, time.monotonic() + self.ttl)
+        bucket = self._entries.setdefault(context_key, [])
+        bucket.append(entry)
+        del bucket[:-MAX_ANSWERS_PER_CONTEXT]
+        self._entries.move_to_end(context_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+answer_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,45 @@
+"""In-memory index of customer names for matching names directly in query text."""
+import time
+from typing import Dict, List, Optional, Pattern
+from app.config import settings
+from app.db.repositories import DataRepository
+from app.utils.names import build_name_pattern
+
+
+class CustomerNameIndex:
+    """All customer names compiled into one pattern, plus a name -> ids map.
+
+    A single pass over the query finds every known customer, and the matched
+    ids can then be loaded with one batched query instead of an ILIKE scan
+    per name. The index reloads from the DB once it is older than `ttl`.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.pattern: Optional[Pattern] = None
+        self._ids_by_name: Dict[str, List[int]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def refresh(self, repo: DataRepository) -> None:
+        customers = await repo.get_all_customers()
+        ids_by_name: Dict[str, List[int]] = {}
+        for cust in customers:
+            if cust.full_name:
+                ids_by_name.setdefault(cust.full_name.strip().lower(), []).append(cust.id)
+        self._ids_by_name = ids_by_name
+        self.pattern = build_name_pattern(c.full_name for c in customers)
+        self._loaded_at = time.monotonic()
+
+    async def ensure_fresh(self, repo: DataRepository) -> "CustomerNameIndex":
+        if self.is_stale():
+            await self.refresh(repo)
+        return self
+
+    def ids_for(self, name: str) -> List[int]:
+        return self._ids_by_name.get(name.strip().lower(), [])
+
+
+customer_index = CustomerNameIndex(ttl=settings.CUSTOMER_NAME_CACHE_TTL)
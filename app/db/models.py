@@ -22,7 +22,7 @@ class SourceLimit(Base):
 class EngineInput(Base):
     __tablename__ = "engine_inputs"
     id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("customers.id"))
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
     source_system = Column(Text)
     indicator = Column(Text)
     schema_code = Column(Text)
@@ -40,8 +40,8 @@ class EngineInput(Base):
 class RuleTrigger(Base):
     __tablename__ = "rule_triggers"
     id = Column(Integer, primary_key=True, index=True)
-    input_id = Column(Integer, ForeignKey("engine_inputs.id"))
-    rule_code = Column(Text)
+    input_id = Column(Integer, ForeignKey("engine_inputs.id"), index=True)
+    rule_code = Column(Text, index=True)
     triggered_at = Column(DateTime, default=datetime.utcnow)
     
     engine_input = relationship("EngineInput", back_populates="rule_triggers")
@@ -49,7 +49,7 @@ class RuleTrigger(Base):
 class Decision(Base):
     __tablename__ = "decisions"
     id = Column(Integer, primary_key=True, index=True)
-    input_id = Column(Integer, ForeignKey("engine_inputs.id"))
+    input_id = Column(Integer, ForeignKey("engine_inputs.id"), index=True)
     final_decision = Column(Text)
     combined_score = Column(Integer)
     action = Column(Text)
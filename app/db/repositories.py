@@ -1,46 +1,109 @@
+from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, bindparam
 from app.db.models import Customer, EngineInput, RuleTrigger, Decision, SourceLimit, AuditLog
 
+# Statements are built once at import and bound per call; SQLAlchemy then reuses
+# the compiled SQL from its cache and asyncpg reuses the prepared statement.
+_Q_CUSTOMER_BY_NAME = select(Customer).where(Customer.full_name.ilike(bindparam("pattern")))
+_Q_CUSTOMERS_BY_IDS = select(Customer).where(Customer.id.in_(bindparam("ids", expanding=True)))
+_Q_ALL_CUSTOMERS = select(Customer)
+_Q_SOURCE_LIMIT = select(SourceLimit).where(SourceLimit.source_system == bindparam("source_system"))
+_Q_SOURCE_LIMITS = select(SourceLimit).where(SourceLimit.source_system.in_(bindparam("source_systems", expanding=True)))
+_Q_ALL_SOURCE_LIMITS = select(SourceLimit)
+_Q_ENGINE_INPUT_BY_ID = select(EngineInput).where(EngineInput.id == bindparam("input_id"))
+_Q_ENGINE_INPUTS_BY_CUSTOMER = select(EngineInput).where(EngineInput.customer_id == bindparam("customer_id"))
+_Q_ENGINE_INPUTS_FOR_CUSTOMERS = (
+    select(EngineInput).where(EngineInput.customer_id.in_(bindparam("ids", expanding=True))).order_by(EngineInput.id)
+)
+_Q_TRIGGERS_BY_INPUT = select(RuleTrigger).where(RuleTrigger.input_id == bindparam("input_id"))
+_Q_TRIGGERS_FOR_INPUTS = (
+    select(RuleTrigger).where(RuleTrigger.input_id.in_(bindparam("ids", expanding=True))).order_by(RuleTrigger.id)
+)
+_Q_DECISION_BY_INPUT = select(Decision).where(Decision.input_id == bindparam("input_id"))
+_Q_DECISIONS_FOR_INPUTS = (
+    select(Decision).where(Decision.input_id.in_(bindparam("ids", expanding=True))).order_by(Decision.id)
+)
+_Q_TRIGGERS_BY_RULE_CODE = select(RuleTrigger).where(RuleTrigger.rule_code == bindparam("rule_code"))
+_Q_TRIGGERS_BY_RULE_CODES = (
+    select(RuleTrigger).where(RuleTrigger.rule_code.in_(bindparam("rule_codes", expanding=True))).order_by(RuleTrigger.id)
+)
+
 class DataRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def get_customer_by_name(self, name: str):
-        result = await self.db.execute(select(Customer).where(Customer.full_name.ilike(f"%{name}%")))
+        result = await self.db.execute(_Q_CUSTOMER_BY_NAME, {"pattern": f"%{name}%"})
         return result.scalars().first()
 
+    async def get_customers_by_ids(self, customer_ids: List[int]):
+        if not customer_ids:
+            return []
+        result = await self.db.execute(_Q_CUSTOMERS_BY_IDS, {"ids": customer_ids})
+        return result.scalars().all()
+
     async def get_all_customers(self):
-        result = await self.db.execute(select(Customer))
+        result = await self.db.execute(_Q_ALL_CUSTOMERS)
         return result.scalars().all()
 
     async def get_source_limit(self, source_system: str):
-        result = await self.db.execute(select(SourceLimit).where(SourceLimit.source_system == source_system))
+        result = await self.db.execute(_Q_SOURCE_LIMIT, {"source_system": source_system})
         return result.scalars().first()
 
+    async def get_source_limits(self, source_systems: List[str]):
+        if not source_systems:
+            return []
+        result = await self.db.execute(_Q_SOURCE_LIMITS, {"source_systems": source_systems})
+        return result.scalars().all()
+
     async def get_all_source_limits(self):
-        result = await self.db.execute(select(SourceLimit))
+        result = await self.db.execute(_Q_ALL_SOURCE_LIMITS)
         return result.scalars().all()
 
     async def get_engine_input_by_id(self, input_id: int):
-        result = await self.db.execute(select(EngineInput).where(EngineInput.id == input_id))
+        result = await self.db.execute(_Q_ENGINE_INPUT_BY_ID, {"input_id": input_id})
         return result.scalars().first()
 
     async def get_engine_inputs_by_customer(self, customer_id: int):
-        result = await self.db.execute(select(EngineInput).where(EngineInput.customer_id == customer_id))
+        result = await self.db.execute(_Q_ENGINE_INPUTS_BY_CUSTOMER, {"customer_id": customer_id})
         return result.scalars().all()
 
     async def get_rule_triggers_by_input(self, input_id: int):
-        result = await self.db.execute(select(RuleTrigger).where(RuleTrigger.input_id == input_id))
+        result = await self.db.execute(_Q_TRIGGERS_BY_INPUT, {"input_id": input_id})
         return result.scalars().all()
 
     async def get_decision_by_input(self, input_id: int):
-        result = await self.db.execute(select(Decision).where(Decision.input_id == input_id))
+        result = await self.db.execute(_Q_DECISION_BY_INPUT, {"input_id": input_id})
         return result.scalars().first()
 
+    async def get_engine_inputs_for_customers(self, customer_ids: List[int]):
+        if not customer_ids:
+            return []
+        result = await self.db.execute(_Q_ENGINE_INPUTS_FOR_CUSTOMERS, {"ids": customer_ids})
+        return result.scalars().all()
+
+    async def get_triggers_for_inputs(self, input_ids: List[int]):
+        if not input_ids:
+            return []
+        result = await self.db.execute(_Q_TRIGGERS_FOR_INPUTS, {"ids": input_ids})
+        return result.scalars().all()
+
+    async def get_decisions_for_inputs(self, input_ids: List[int]):
+        if not input_ids:
+            return []
+        result = await self.db.execute(_Q_DECISIONS_FOR_INPUTS, {"ids": input_ids})
+        return result.scalars().all()
+
+    async def search_by_rule_codes(self, rule_codes: List[str]):
+        if not rule_codes:
+            return []
+        result = await self.db.execute(_Q_TRIGGERS_BY_RULE_CODES, {"rule_codes": rule_codes})
+        return result.scalars().all()
+
     async def search_by_rule_code(self, rule_code: str):
-        result = await self.db.execute(select(RuleTrigger).where(RuleTrigger.rule_code == rule_code))
+        result = await self.db.execute(_Q_TRIGGERS_BY_RULE_CODE, {"rule_code": rule_code})
         return result.scalars().all()
         """
         DANGEROUS: For the agent to run generated SQL.
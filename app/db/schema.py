@@ -0,0 +1,70 @@
+"""One-shot DDL for the code_chunks embedding table.
+
+Run at API startup and by run_indexer.py before indexing; the indexers
+assume the table exists with the configured embedding type and dimension.
+Every uvicorn worker runs the startup hook, so schema transactions take
+lock_schema() first and run one at a time.
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.config import settings
+from app.db.session import engine
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+SCHEMA_LOCK_KEY = 0x46574453
+
+
+async def lock_schema(conn: AsyncConnection) -> None:
+    """Serialize schema changes across processes until the current transaction ends.
+
+    A transaction-level lock is used so it also works behind a transaction-mode
+    pooler; each step must therefore be idempotent, since later workers repeat it.
+    """
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def _code_chunks_ddl() -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS code_chunks (
+            id SERIAL PRIMARY KEY,
+            repo TEXT NOT NULL,
+            path TEXT NOT NULL,
+            content TEXT NOT NULL,
+            embedding {settings.embedding_type}({settings.EMBEDDING_DIM}),
+            content_hash BYTEA,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+    """
+
+
+async def ensure_code_chunks_schema() -> None:
+    """Create code_chunks if missing; recreate it if its embedding dimension is not EMBEDDING_DIM.
+
+    Chunks embedded at another dimension cannot be searched with the current
+    model, so they are dropped along with the indexed-commit records, which
+    makes the next indexer run a full one.
+    """
+    async with engine.begin() as conn:
+        await lock_schema(conn)
+        # pgvector stores the dimension directly in atttypmod
+        existing_dim = (
+            await conn.execute(
+                text(
+                    "SELECT atttypmod FROM pg_attribute "
+                    "WHERE attrelid = to_regclass('code_chunks') AND attname = 'embedding'"
+                )
+            )
+        ).scalar()
+        if existing_dim is not None and existing_dim != settings.EMBEDDING_DIM:
+            logger.warning(
+                f"code_chunks dimension mismatch: existing={existing_dim} expected={settings.EMBEDDING_DIM}. Recreating table."
+            )
+            await conn.execute(text("DROP TABLE code_chunks"))
+            if (await conn.execute(text("SELECT to_regclass('indexer_metadata') IS NOT NULL"))).scalar():
+                await conn.execute(text("DELETE FROM indexer_metadata"))
+        await conn.execute(text(_code_chunks_ddl()))
+        # Tables created before change detection lack the per-file content hash
+        await conn.execute(text("ALTER TABLE code_chunks ADD COLUMN IF NOT EXISTS content_hash BYTEA"))
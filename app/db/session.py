@@ -1,8 +1,31 @@
+from pgvector.asyncpg import register_vector
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+# PgBouncer in transaction mode hands each transaction a different server
+# connection, so asyncpg's per-connection prepared statements must be off.
+_connect_args = {"statement_cache_size": 0} if settings.DB_PGBOUNCER_TRANSACTION_MODE else {}
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=False,
+    connect_args=_connect_args,
+)
+
+if engine.dialect.driver == "asyncpg":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _register_vector_codec(dbapi_connection, connection_record):
+        """Send/receive pgvector values as binary float32 (numpy arrays) instead of text."""
+        try:
+            dbapi_connection.run_async(register_vector)
+        except ValueError:
+            pass  # vector extension not installed in this database
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
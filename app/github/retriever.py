@@ -1,18 +1,75 @@
 """GitHub-based retriever providing hybrid lexical + vector search."""
 from __future__ import annotations
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from pydantic import BaseModel
+import asyncio
 import httpx
-import base64
+import orjson
+import re
 from sqlalchemy import text
 from app.config import settings
 from app.db.session import AsyncSessionLocal
 from app.llm.embeddings import get_query_embedding
+from app.utils.http import get_http_client
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+# The query embedding is bound once as :emb (CAST rather than '::' so text()
+# does not read it as a bind) and sent in pgvector's binary format via the
+# codec registered in app.db.session; with halfvec storage the fp32 -> fp16
+# conversion happens at bind time. <#> is negative inner product, served by
+# the {vector,halfvec}_ip_ops HNSW index; the constant SQL text lets asyncpg
+# reuse its prepared statement across searches.
+_VECTOR_SEARCH_SQL = text(
+    f"""
+    SELECT path, content, -(embedding <#> CAST(:emb AS {settings.embedding_type})) AS score
+    FROM code_chunks
+    WHERE repo = :repo
+    ORDER BY embedding <#> CAST(:emb AS {settings.embedding_type}) ASC
+    LIMIT :limit
+    """
+)
+
+
+# Words too generic to narrow a code search
+_STOPWORDS = frozenset({
+    "sending", "simulate", "decision", "with", "from", "that", "this",
+    "what", "which", "where", "when", "does", "will",
+})
+# Identifier-like tokens of 4+ characters; punctuation is dropped
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{3,}")
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Reciprocal Rank Fusion constant (standard value; damps the weight of top ranks)
+RRF_K = 60
+
+_embedding_column_dim: Optional[int] = None
+
+
+async def get_embedding_column_dim() -> Optional[int]:
+    """Dimension of code_chunks.embedding, read from pg_attribute once per process.
+
+    None (not cached) while the table does not exist yet.
+    """
+    global _embedding_column_dim
+    if _embedding_column_dim is None:
+        async with AsyncSessionLocal() as session:
+            row = (
+                await session.execute(
+                    text(
+                        "SELECT atttypmod FROM pg_attribute "
+                        "WHERE attrelid = to_regclass('code_chunks') AND attname = 'embedding'"
+                    )
+                )
+            ).fetchone()
+        if row:
+            _embedding_column_dim = row[0]  # pgvector stores dimension directly
+    return _embedding_column_dim
+
+
 class CodeSnippet(BaseModel):
     path: str
     content: str
@@ -21,34 +78,55 @@ class CodeSnippet(BaseModel):
     source: Optional[str] = None   # 'github_search' | 'vector' | 'hybrid'
 
 
+async def _no_snippets() -> List[CodeSnippet]:
+    return []
+
+
 class GitHubRepoRetriever:
     """Hybrid retriever for a remote GitHub repository."""
 
-    def __init__(self, repo: Optional[str] = None, max_files: int = 8):
+    # Lexical and vector search ignore the intent, so callers may start
+    # retrieval before entity extraction has finished.
+    uses_intent = False
+
+    def __init__(self, repo: Optional[str] = None, max_files: int = 8, client: Optional[httpx.AsyncClient] = None):
         self.repo = repo or settings.github_repo_name
         self.max_files = max_files
         self.token = settings.GITHUB_TOKEN
+        self._client = client
+        # Bounds concurrent contents-API calls (GitHub secondary rate limits)
+        self._fetch_semaphore = asyncio.Semaphore(5)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Injected client, else the app-wide pooled client (owned and closed by app.main)."""
+        return self._client or get_http_client()
 
     async def retrieve_logic_snippets(self, user_query: str, intent: str = "general_query", top_k: int = 6) -> List[CodeSnippet]:
-        lexical_snippets: List[CodeSnippet] = []
+        # Lexical (GitHub API) and vector (embedding API + DB) search are independent; run them together
         if self.token:
-            lexical_snippets = await self._github_code_search(user_query)
+            lexical_search = self._github_code_search(user_query)
         else:
             logger.warning("No GitHub token available, skipping live search")
-
-        vector_snippets: List[CodeSnippet] = []
+            lexical_search = _no_snippets()
         if settings.ENABLE_EMBED_INDEX and settings.HYBRID_RETRIEVAL:
-            try:
-                vector_snippets = await self._vector_search(user_query, limit=top_k)
-            except Exception as e:
-                logger.error(f"Vector search failed: {e}")
+            vector_search = self._vector_search(user_query, limit=top_k)
+        else:
+            vector_search = _no_snippets()
+
+        lexical_snippets, vector_snippets = await asyncio.gather(lexical_search, vector_search, return_exceptions=True)
+        if isinstance(lexical_snippets, BaseException):
+            logger.error("GitHub code search failed: %s", lexical_snippets)
+            lexical_snippets = []
+        if isinstance(vector_snippets, BaseException):
+            logger.error("Vector search failed: %s", vector_snippets)
+            vector_snippets = []
 
         merged = self._merge_results(lexical_snippets, vector_snippets)
         merged.sort(key=lambda c: c.score or 0, reverse=True)
         return merged[:top_k]
 
     async def _github_code_search(self, query: str) -> List[CodeSnippet]:
-        keywords = [w for w in query.split() if len(w) > 3 and w.lower() not in {"sending", "simulate", "decision", "with", "from"}]
+        keywords = [t for t in _TOKEN_RE.findall(query) if t.lower() not in _STOPWORDS]
         search_terms = " ".join(keywords[:5])
         q = f"{search_terms} repo:{self.repo} language:Python"
         url = "https://api.github.com/search/code"
@@ -57,94 +135,124 @@ class GitHubRepoRetriever:
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
         results: List[CodeSnippet] = []
-        async with httpx.AsyncClient(timeout=40) as client:
-            resp = await client.get(url, params=params, headers=headers)
-            if resp.status_code != 200:
-                logger.error(f"GitHub code search error {resp.status_code}: {resp.text[:120]}")
-                return results
-            data = resp.json()
-            total_count = data.get("total_count", 0)
-            logger.info(f"GitHub lexical search: {total_count} files found, fetching top {self.max_files}")
-            for item in data.get("items", [])[: self.max_files]:
-                file_path = item.get("path")
-                raw_url = item.get("url")  # contents API URL
-                content = await self._fetch_raw_content(client, raw_url)
-                if not content:
-                    continue
-                results.append(
-                    CodeSnippet(
-                        path=file_path,
-                        content=content[:2000],
-                        url=f"https://github.com/{self.repo}/blob/HEAD/{file_path}",
-                        score=0.6,  # base lexical score
-                        source="github_search",
-                    )
+        client = self._get_client()
+        resp = await client.get(url, params=params, headers=headers)
+        if resp.status_code != 200:
+            logger.error("GitHub code search error %s: %s", resp.status_code, resp.text[:120])
+            return results
+        data = orjson.loads(resp.content)
+        total_count = data.get("total_count", 0)
+        logger.info("GitHub lexical search: %d files found, fetching top %d", total_count, self.max_files)
+        items = data.get("items", [])[: self.max_files]
+        # One GraphQL request for all hit files; REST contents calls only for what it missed
+        texts = await self._fetch_contents_graphql(client, [item.get("path") for item in items])
+        missing = [item for item in items if item.get("path") not in texts]
+        if missing:
+            contents = await asyncio.gather(
+                *[self._fetch_raw_content(client, item.get("url")) for item in missing],
+                return_exceptions=True,
+            )
+            for item, content in zip(missing, contents):
+                if content and not isinstance(content, BaseException):
+                    texts[item.get("path")] = content
+        for item in items:
+            file_path = item.get("path")
+            content = texts.get(file_path)
+            if not content:
+                continue
+            results.append(
+                CodeSnippet(
+                    path=file_path,
+                    content=content[:2000],
+                    url=f"https://github.com/{self.repo}/blob/HEAD/{file_path}",
+                    score=0.6,  # base lexical score
+                    source="github_search",
                 )
+            )
         return results
 
+    async def _fetch_contents_graphql(self, client: httpx.AsyncClient, paths: Sequence[str]) -> Dict[str, str]:
+        """Fetch several files at HEAD in one GraphQL query (one aliased `object` per path).
+
+        Returns path -> text for the blobs GitHub returned; binary or oversized
+        blobs, and any request failure, are simply absent from the result.
+        """
+        owner, _, name = self.repo.partition("/")
+        if not paths or not self.token or not name:
+            return {}
+        fields = " ".join(f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ text }} }}" for i in range(len(paths)))
+        var_decls = "".join(f", $e{i}: String!" for i in range(len(paths)))
+        query = f"query($owner: String!, $name: String!{var_decls}) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+        variables = {"owner": owner, "name": name, **{f"e{i}": f"HEAD:{path}" for i, path in enumerate(paths)}}
+        try:
+            resp = await client.post(
+                GITHUB_GRAPHQL_URL,
+                content=orjson.dumps({"query": query, "variables": variables}),
+                headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"},
+            )
+        except httpx.HTTPError as e:
+            logger.warning("GitHub GraphQL contents fetch failed: %s", e)
+            return {}
+        if resp.status_code != 200:
+            logger.warning("GitHub GraphQL contents error %s: %s", resp.status_code, resp.text[:120])
+            return {}
+        repo_data = (orjson.loads(resp.content).get("data") or {}).get("repository") or {}
+        texts: Dict[str, str] = {}
+        for i, path in enumerate(paths):
+            blob = repo_data.get(f"f{i}") or {}
+            if blob.get("text"):
+                texts[path] = blob["text"]
+        return texts
+
     async def _fetch_raw_content(self, client: httpx.AsyncClient, contents_api_url: str) -> Optional[str]:
-        headers = {}
+        # The raw media type returns the file body itself instead of base64 inside JSON
+        headers = {"Accept": "application/vnd.github.raw"}
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
-        r = await client.get(contents_api_url, headers=headers)
-        if r.status_code != 200:
-            return None
-        data = r.json()
-        encoded = data.get("content")
-        if not encoded:
-            return None
-        try:
-            return base64.b64decode(encoded).decode("utf-8", errors="ignore")
-        except Exception:
+        async with self._fetch_semaphore:
+            r = await client.get(contents_api_url, headers=headers)
+        if r.status_code != 200 or not r.content:
             return None
+        return r.content.decode("utf-8", errors="ignore")
 
     async def _vector_search(self, query: str, limit: int = 6) -> List[CodeSnippet]:
         """Execute semantic search using pgvector embeddings.
         
         Expands query with code-relevant context for better matching.
         Checks dimension compatibility before executing search.
-        Returns top-k most similar code chunks based on cosine similarity.
+        Returns top-k most similar code chunks by inner product, which equals
+        cosine similarity because stored and query embeddings are unit length.
         """
+        # Check existing embedding vector dimension to avoid DataError (cached per process)
+        try:
+            existing_dim = await get_embedding_column_dim()
+            if existing_dim is not None and existing_dim != settings.EMBEDDING_DIM:
+                logger.warning("Vector dimension mismatch: table=%s, config=%s. Re-indexing required.", existing_dim, settings.EMBEDDING_DIM)
+                return []
+        except Exception as e:
+            # Dimension check is optional - if it fails, proceed with vector search anyway
+            logger.debug("Dimension check skipped: %s", e)
+        
         # Expand query with code-relevant context for better semantic matching
         expanded_query = f"""Python code that handles: {query}
         Relevant logic: decision rules, scoring, limits, validation, finalization
         """
         embedding = await get_query_embedding(expanded_query)
-        embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
-        
-        # Check existing embedding vector dimension to avoid DataError (separate session)
-        try:
-            async with AsyncSessionLocal() as dim_session:
-                dim_row = await dim_session.execute(text("SELECT atttypmod FROM pg_attribute WHERE attrelid = 'code_chunks'::regclass AND attname='embedding'"))
-                dim_fetch = dim_row.fetchone()
-                if dim_fetch:
-                    existing_dim = dim_fetch[0]  # pgvector stores dimension directly
-                    if existing_dim != settings.EMBEDDING_DIM:
-                        logger.warning(f"Vector dimension mismatch: table={existing_dim}, config={settings.EMBEDDING_DIM}. Re-indexing required.")
-                        return []
-        except Exception as e:
-            # Dimension check is optional - if it fails, proceed with vector search anyway
-            logger.debug(f"Dimension check skipped: {e}")
-        
+
         # Execute vector search with fresh session
         try:
             async with AsyncSessionLocal() as session:
-                # Build SQL with inlined embedding cast to avoid asyncpg ':' cast syntax issue
-                safe_embed = embedding_str.replace("'", "")  # embedding_str has only digits, commas, minus signs
-                sql = text(
-                    f"""
-                    SELECT path, content, 1 - (embedding <=> '{safe_embed}'::vector) AS score
-                    FROM code_chunks
-                    WHERE repo = :repo
-                    ORDER BY embedding <=> '{safe_embed}'::vector ASC
-                    LIMIT :limit
-                    """
-                )
-                rows = (await session.execute(sql, {"repo": self.repo, "limit": limit})).fetchall()
+                # HNSW recall/latency knob for this transaction only
+                await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_EF_SEARCH)}"))
+                rows = (
+                    await session.execute(
+                        _VECTOR_SEARCH_SQL, {"emb": embedding, "repo": self.repo, "limit": limit}
+                    )
+                ).fetchall()
                 if not rows:
-                    logger.warning(f"Vector search: 0 chunks found for repo={self.repo}")
+                    logger.warning("Vector search: 0 chunks found for repo=%s", self.repo)
                 else:
-                    logger.info(f"Vector search: {len(rows)} chunks found")
+                    logger.info("Vector search: %d chunks found", len(rows))
                 return [
                     CodeSnippet(
                         path=row[0],
@@ -156,18 +264,27 @@ class GitHubRepoRetriever:
                     for row in rows
                 ]
         except Exception as e:
-            logger.error(f"Vector search execution failed: {e}")
+            logger.error("Vector search execution failed: %s", e)
             return []
 
     def _merge_results(self, lexical: List[CodeSnippet], vector: List[CodeSnippet]) -> List[CodeSnippet]:
+        """Reciprocal Rank Fusion of the ranked lists, deduplicated by path.
+
+        Each list adds 1 / (RRF_K + rank) for the best-ranked occurrence of a
+        path, so lexical and vector scores need no calibration against each other.
+        """
         by_path: dict[str, CodeSnippet] = {}
-        for item in lexical + vector:
-            if item.path not in by_path:
-                by_path[item.path] = item
-            else:
-                existing = by_path[item.path]
-                existing.score = max(existing.score or 0, item.score or 0)
+        fused: dict[str, float] = {}
+        for ranked in (lexical, vector):
+            seen: set[str] = set()
+            for rank, item in enumerate(ranked, 1):
+                existing = by_path.setdefault(item.path, item)
                 if existing.source != item.source:
                     existing.source = "hybrid"
+                if item.path not in seen:
+                    seen.add(item.path)
+                    fused[item.path] = fused.get(item.path, 0.0) + 1.0 / (RRF_K + rank)
+        for path, item in by_path.items():
+            item.score = fused[path]
         return list(by_path.values())
 
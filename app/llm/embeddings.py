@@ -5,78 +5,215 @@ Current strategy:
  - Else fall back to a lightweight hash -> pseudo-vector (for development only).
 
 Production: Replace fallback with a proper local embedding model or other provider.
+
+Embeddings are float32 numpy arrays of length EMBEDDING_DIM (batches are
+(N, EMBEDDING_DIM) matrices); the pgvector asyncpg codec binds them as-is.
 """
 from __future__ import annotations
+import asyncio
 import hashlib
-import math
-from typing import List
-import httpx
+from typing import List, Optional, Tuple
+import numpy as np
+import orjson
 from app.config import settings
+from app.utils.http import get_http_client
+from app.utils.cache import TTLCache
+from app.utils.ratelimit import TokenBucket
 
+# Paces batch requests at the provider quota; rejected requests cost a round
+# trip plus the Retry-After wait
+_embed_limiter = TokenBucket(settings.EMBED_RPS)
 
-async def get_embedding(text: str) -> List[float]:
-    """Return an embedding vector for input text using configured provider.
 
-    Providers:
-      - Gemini (`gemini-embedding-001`): uses Google Generative Language API.
-      - OpenAI: if EMBEDDING_PROVIDER='openai'.
-      - Fallback hash embedding: deterministic, low quality (development only).
+def _zero_embedding() -> np.ndarray:
+    return np.zeros(settings.EMBEDDING_DIM, dtype=np.float32)
+
+
+def _normalize_vector(values: List[float]) -> np.ndarray:
+    """Truncate or zero-pad to EMBEDDING_DIM, then scale to unit length.
+
+    Providers may return variable length, and truncated Gemini vectors are not
+    unit length. Unit vectors let vector search use inner product (`<#>`),
+    which ranks the same as cosine without per-row norms.
     """
-    text = text.strip()
-    if not text:
-        return [0.0] * settings.EMBEDDING_DIM
+    vec = np.asarray(values[: settings.EMBEDDING_DIM], dtype=np.float32)
+    if vec.shape[0] < settings.EMBEDDING_DIM:
+        vec = np.pad(vec, (0, settings.EMBEDDING_DIM - vec.shape[0]))
+    norm = np.linalg.norm(vec)
+    if norm:
+        vec /= norm
+    return vec
 
+
+async def _remote_embedding(text: str) -> Optional[np.ndarray]:
+    """Embed with the configured provider; None when no provider is configured or the call failed."""
     provider = settings.EMBEDDING_PROVIDER.lower()
 
     if provider == "gemini" and settings.GEMINI_API_KEY:
         try:
             endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.EMBEDDING_MODEL}:embedContent?key={settings.GEMINI_API_KEY}"
-            async with httpx.AsyncClient(timeout=40) as client:
-                resp = await client.post(endpoint, json={"content": {"parts": [{"text": text}]}})
+            resp = await get_http_client().post(endpoint, json={"content": {"parts": [{"text": text}]}}, timeout=40)
             resp.raise_for_status()
-            data = resp.json()
+            data = orjson.loads(resp.content)
             vec = data.get("embedding", {}).get("values")
             if not vec:
                 raise ValueError("Gemini embedding response missing 'embedding.values'.")
-            # Gemini may return variable length; normalize to EMBEDDING_DIM if needed
-            if len(vec) != settings.EMBEDDING_DIM:
-                if len(vec) > settings.EMBEDDING_DIM:
-                    vec = vec[: settings.EMBEDDING_DIM]
-                else:
-                    # pad with zeros
-                    vec = vec + [0.0] * (settings.EMBEDDING_DIM - len(vec))
-            return vec
+            return _normalize_vector(vec)
         except Exception as e:
             print(f"[Embedding] Gemini error, falling back: {e}")
 
     if provider == "openai" and settings.OPENAI_API_KEY:
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(
-                    "https://api.openai.com/v1/embeddings",
-                    headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
-                    json={"input": text, "model": settings.EMBEDDING_MODEL},
-                )
+            resp = await get_http_client().post(
+                "https://api.openai.com/v1/embeddings",
+                headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
+                json={"input": text, "model": settings.EMBEDDING_MODEL},
+                timeout=30,
+            )
             resp.raise_for_status()
-            data = resp.json()
-            vec = data["data"][0]["embedding"]
-            if len(vec) != settings.EMBEDDING_DIM:
-                if len(vec) > settings.EMBEDDING_DIM:
-                    vec = vec[: settings.EMBEDDING_DIM]
-                else:
-                    vec = vec + [0.0] * (settings.EMBEDDING_DIM - len(vec))
-            return vec
+            data = orjson.loads(resp.content)
+            return _normalize_vector(data["data"][0]["embedding"])
         except Exception as e:
             print(f"[Embedding] OpenAI error, falling back: {e}")
 
-    # Fallback: deterministic pseudo embedding based on SHA256 hash
-    h = hashlib.sha256(text.encode("utf-8")).digest()
-    needed = settings.EMBEDDING_DIM
-    repeats = math.ceil(needed / len(h))
-    raw = (h * repeats)[:needed]
-    vec = [((b / 255.0) * 2.0) - 1.0 for b in raw]
+    return None
+
+
+async def _remote_embeddings_batch(texts: List[str]) -> Optional[List[np.ndarray]]:
+    """Embed several texts in one provider request; None when unavailable or the call failed."""
+    provider = settings.EMBEDDING_PROVIDER.lower()
+
+    if provider == "gemini" and settings.GEMINI_API_KEY:
+        try:
+            endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.EMBEDDING_MODEL}:batchEmbedContents?key={settings.GEMINI_API_KEY}"
+            model = f"models/{settings.EMBEDDING_MODEL}"
+            requests = [{"model": model, "content": {"parts": [{"text": t}]}} for t in texts]
+            resp = await get_http_client().post(endpoint, json={"requests": requests}, timeout=90)
+            resp.raise_for_status()
+            vecs = [item.get("values") for item in orjson.loads(resp.content).get("embeddings", [])]
+            if len(vecs) != len(texts) or not all(vecs):
+                raise ValueError("Gemini batch embedding response missing 'embeddings[].values'.")
+            return [_normalize_vector(vec) for vec in vecs]
+        except Exception as e:
+            print(f"[Embedding] Gemini batch error, falling back: {e}")
+
+    if provider == "openai" and settings.OPENAI_API_KEY:
+        try:
+            resp = await get_http_client().post(
+                "https://api.openai.com/v1/embeddings",
+                headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
+                json={"input": texts, "model": settings.EMBEDDING_MODEL},
+                timeout=90,
+            )
+            resp.raise_for_status()
+            items = sorted(orjson.loads(resp.content)["data"], key=lambda item: item["index"])
+            return [_normalize_vector(item["embedding"]) for item in items]
+        except Exception as e:
+            print(f"[Embedding] OpenAI batch error, falling back: {e}")
+
+    return None
+
+
+def _hash_embedding(text: str) -> np.ndarray:
+    """Deterministic pseudo embedding from SHAKE-256 output bytes (development only)."""
+    raw = np.frombuffer(hashlib.shake_256(text.encode("utf-8")).digest(settings.EMBEDDING_DIM), dtype=np.uint8)
+    vec = raw.astype(np.float32) * np.float32(2.0 / 255.0) - np.float32(1.0)
+    norm = np.linalg.norm(vec)
+    if norm:
+        vec /= norm
     return vec
 
 
-async def get_query_embedding(query: str) -> List[float]:
-    return await get_embedding(query)
+async def get_embedding(text: str) -> np.ndarray:
+    """Return an embedding vector for input text using configured provider.
+
+    Providers:
+      - Gemini (`gemini-embedding-001`): uses Google Generative Language API.
+      - OpenAI: if EMBEDDING_PROVIDER='openai'.
+      - Fallback hash embedding: deterministic, low quality (development only).
+    """
+    text = text.strip()
+    if not text:
+        return _zero_embedding()
+
+    vec = await _remote_embedding(text)
+    return vec if vec is not None else _hash_embedding(text)
+
+
+async def get_embeddings_batch(texts: List[str], batch_size: int = 100, concurrency: int = 4) -> np.ndarray:
+    """Embed many texts with one provider request per `batch_size` texts (used by the indexers).
+
+    Returns a (len(texts), EMBEDDING_DIM) float32 matrix in input order. Up to
+    `concurrency` batch requests are in flight at once (100 is Gemini's
+    batchEmbedContents maximum); a batch whose request fails falls back to hash
+    embeddings, like get_embedding().
+    """
+    vectors, _ = await get_embeddings_batch_with_source(texts, batch_size, concurrency)
+    return vectors
+
+
+async def get_embeddings_batch_with_source(
+    texts: List[str], batch_size: int = 100, concurrency: int = 4
+) -> Tuple[np.ndarray, np.ndarray]:
+    """get_embeddings_batch() plus a bool mask of rows that came from the provider.
+
+    Rows outside the mask are hash fallbacks or zero vectors for empty text,
+    which callers should not persist in a cache.
+    """
+    cleaned = [t.strip() for t in texts]
+    vectors = np.zeros((len(cleaned), settings.EMBEDDING_DIM), dtype=np.float32)
+    remote = np.zeros(len(cleaned), dtype=bool)
+    non_empty = [i for i, t in enumerate(cleaned) if t]
+    batches = [non_empty[i : i + batch_size] for i in range(0, len(non_empty), batch_size)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_batch(batch: List[int]) -> Optional[List[np.ndarray]]:
+        async with semaphore, _embed_limiter:
+            return await _remote_embeddings_batch([cleaned[i] for i in batch])
+
+    results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
+    for batch, batch_vectors in zip(batches, results):
+        for pos, i in enumerate(batch):
+            vectors[i] = batch_vectors[pos] if batch_vectors is not None else _hash_embedding(cleaned[i])
+        if batch_vectors is not None:
+            remote[batch] = True
+    return vectors, remote
+
+
+def to_storage_dtype(vectors: np.ndarray) -> np.ndarray:
+    """float16 copy when code_chunks stores halfvec, else unchanged.
+
+    The halfvec codec sends fp16 either way; casting early halves the memory
+    of rows the indexers hold until insert.
+    """
+    return vectors.astype(np.float16) if settings.EMBEDDING_HALFVEC else vectors
+
+
+# Query embeddings never change for a given provider/model, so repeats skip the API.
+# Entries are 3-6 KB each (768-1536 float32) and read-only, since callers share
+# them; the TTL only bounds how long a vector from a since-changed model config
+# can linger.
+_query_embedding_cache = TTLCache(maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE, ttl=24 * 3600)
+
+
+async def get_query_embedding(query: str) -> np.ndarray:
+    """get_embedding() for search queries, served from an in-process LRU when possible.
+
+    Hash fallbacks are not cached so a transient provider error does not stick.
+    """
+    text = query.strip()
+    if not text:
+        return _zero_embedding()
+
+    key = (settings.EMBEDDING_PROVIDER.lower(), settings.EMBEDDING_MODEL, " ".join(text.lower().split()))
+    vec = _query_embedding_cache.get(key)
+    if vec is not None:
+        return vec
+
+    vec = await _remote_embedding(text)
+    if vec is None:
+        return _hash_embedding(text)
+    vec.flags.writeable = False
+    _query_embedding_cache.set(key, vec)
+    return vec
@@ -1,58 +1,56 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import time
 import httpx
 from app.config import settings
 
+# Seconds before list_models callers re-probe Ollama for installed models
+OLLAMA_REFRESH_TTL = 60
+
 class ModelRegistry:
     def __init__(self):
         self.models = []
-        self._register_models()
+        self._default_model_id: Optional[str] = None
+        self._primary_models: List[Dict[str, Any]] = []
+        self._ollama_models: List[Dict[str, Any]] = []
+        self._cloud_models: List[Dict[str, Any]] = []
+        self._ollama_refreshed_at: Optional[float] = None
+        self._register_static_models()
+
+    async def reload(self):
+        """Re-register models (re-probing Ollama) and forget the cached default model."""
+        self._register_static_models()
+        await self.refresh_ollama_models(force=True)
+
+    def _rebuild(self):
+        # Order matters for the default model: OpenRouter, Ollama, Gemini, OpenAI
+        self.models = self._primary_models + self._ollama_models + self._cloud_models
+        self._default_model_id = None
+
+    def _register_static_models(self):
+        """Models that only depend on configured API keys (no network calls)."""
+        self._primary_models = []
+        self._cloud_models = []
 
-    def _register_models(self):
         # 1. OpenRouter (Default)
         if settings.OPENROUTER_API_KEY:
-            self.models.append({
+            self._primary_models.append({
                 "id": "openrouter:default",
                 "provider": "openrouter",
                 "label": "OpenRouter Default (Cheap)",
                 "default_usage": "general"
             })
 
-        # 2. Ollama (Dynamic)
-        if settings.OLLAMA_BASE_URL:
-            try:
-                # Attempt to fetch models from Ollama
-                # We use a short timeout so we don't block startup too long
-                with httpx.Client(timeout=2.0) as client:
-                    resp = client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        for model in data.get("models", []):
-                            name = model.get("name")
-                            self.models.append({
-                                "id": f"ollama:{name}",
-                                "provider": "ollama",
-                                "label": f"Ollama {name} (Local)",
-                                "default_usage": "local"
-                            })
-            except Exception as e:
-                print(f"Could not fetch Ollama models: {e}")
-                # Fallback if fetch fails but URL is set
-                self.models.append({
-                    "id": "ollama:llama3",
-                    "provider": "ollama",
-                    "label": "Ollama Llama 3 (Local - Fallback)",
-                    "default_usage": "local"
-                })
+        # 2. Ollama (Dynamic) - see refresh_ollama_models
 
         # 3. Gemini
         if settings.GEMINI_API_KEY:
-            self.models.append({
+            self._cloud_models.append({
                 "id": "gemini:gemini-2.0-flash-exp",
                 "provider": "gemini",
                 "label": "Gemini 2.0 Flash (Experimental)",
                 "default_usage": "general"
             })
-            self.models.append({
+            self._cloud_models.append({
                 "id": "gemini:gemini-2.0-flash-lite-exp",
                 "provider": "gemini",
                 "label": "Gemini 2.0 Flash-Lite (Experimental)",
@@ -61,16 +59,63 @@ class ModelRegistry:
 
         # 4. OpenAI
         if settings.OPENAI_API_KEY:
-            self.models.append({
+            self._cloud_models.append({
                 "id": "openai:gpt-4o-mini",
                 "provider": "openai",
                 "label": "OpenAI GPT-4o mini (cheap default)",
                 "default_usage": "general"
             })
 
+        self._rebuild()
+
+    async def refresh_ollama_models(self, force: bool = False):
+        """Probe Ollama for installed models, at most once per OLLAMA_REFRESH_TTL unless forced."""
+        if not settings.OLLAMA_BASE_URL:
+            return
+        now = time.monotonic()
+        if not force and self._ollama_refreshed_at is not None and now - self._ollama_refreshed_at < OLLAMA_REFRESH_TTL:
+            return
+        self._ollama_refreshed_at = now
+
+        ollama_models = []
+        try:
+            # Attempt to fetch models from Ollama
+            # We use a short timeout so we don't block startup too long
+            async with httpx.AsyncClient(timeout=2.0) as client:
+                resp = await client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
+                if resp.status_code == 200:
+                    data = resp.json()
+                    for model in data.get("models", []):
+                        name = model.get("name")
+                        ollama_models.append({
+                            "id": f"ollama:{name}",
+                            "provider": "ollama",
+                            "label": f"Ollama {name} (Local)",
+                            "default_usage": "local"
+                        })
+        except Exception as e:
+            print(f"Could not fetch Ollama models: {e}")
+            # Fallback if fetch fails but URL is set
+            ollama_models.append({
+                "id": "ollama:llama3",
+                "provider": "ollama",
+                "label": "Ollama Llama 3 (Local - Fallback)",
+                "default_usage": "local"
+            })
+
+        self._ollama_models = ollama_models
+        self._rebuild()
+
     def list_models(self) -> List[Dict[str, Any]]:
         return self.models
 
+    def default_model_id(self) -> Optional[str]:
+        """OpenRouter if configured, else the first registered model (computed once per reload)."""
+        if self._default_model_id is None and self.models:
+            openrouter_model = next((m for m in self.models if m["provider"] == "openrouter"), None)
+            self._default_model_id = (openrouter_model or self.models[0])["id"]
+        return self._default_model_id
+
     def get_model_info(self, model_id: str) -> Dict[str, Any]:
         for m in self.models:
             if m["id"] == model_id:
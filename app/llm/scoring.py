@@ -0,0 +1,70 @@
+"""Cosine similarity top-k over an in-memory embedding matrix.
+
+Used for client-side re-ranking (e.g. the semantic answer cache). numba is
+optional: with it, large candidate sets are scored by a parallel JIT kernel;
+without it (or for small sets, where BLAS wins) numpy does the work.
+"""
+from typing import Tuple
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    NUMBA_AVAILABLE = False
+
+# Below this many rows numpy's matrix-vector product beats the parallel kernel
+NUMBA_MIN_ROWS = 1000
+
+
+def _cosine_scores_numpy(mat: np.ndarray, q: np.ndarray) -> np.ndarray:
+    denom = np.linalg.norm(mat, axis=1) * np.linalg.norm(q)
+    dots = mat @ q
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_scores_numba(mat, q):
+        n, d = mat.shape
+        q_norm = 0.0
+        for j in range(d):
+            q_norm += q[j] * q[j]
+        q_norm = np.sqrt(q_norm)
+        out = np.zeros(n, dtype=np.float32)
+        for i in prange(n):
+            dot = 0.0
+            norm = 0.0
+            for j in range(d):
+                dot += mat[i, j] * q[j]
+                norm += mat[i, j] * mat[i, j]
+            denom = np.sqrt(norm) * q_norm
+            if denom > 0:
+                out[i] = dot / denom
+        return out
+
+
+def cosine_scores(mat: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of `mat` (N, D) with `q` (D,), as float32."""
+    mat = np.ascontiguousarray(mat, dtype=np.float32)
+    q = np.ascontiguousarray(q, dtype=np.float32)
+    if NUMBA_AVAILABLE and mat.shape[0] >= NUMBA_MIN_ROWS:
+        return _cosine_scores_numba(mat, q)
+    return _cosine_scores_numpy(mat, q)
+
+
+def cosine_topk(mat: np.ndarray, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the `k` rows most similar to `q`, best first."""
+    scores = cosine_scores(mat, q)
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx])]
+    return idx, scores[idx]
+
+
+def warmup() -> None:
+    """Compile the numba kernel up front so the first large re-rank does not pay for it."""
+    if NUMBA_AVAILABLE:
+        _cosine_scores_numba(np.ones((2, 4), dtype=np.float32), np.ones(4, dtype=np.float32))
@@ -1,12 +1,25 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import text
-from app.api.routes import router
-from app.db.session import engine
+from app.api.routes import router, close_retrievers
+from app.github.retriever import get_embedding_column_dim
+from app.db.session import engine, AsyncSessionLocal
+from app.db.schema import ensure_code_chunks_schema, lock_schema
+from app.db.repositories import DataRepository
+from app.db.customer_index import customer_index
 from app.db.models import Base
+from app.llm.registry import registry
+from app.utils.http import get_http_client, close_http_client
+from app.vector.incremental import VECTOR_INDEX_NAME, vector_index_is_invalid, vector_index_sql
+from app.llm import scoring
 from app.config import settings
+from app.utils.logger import get_logger
 
-app = FastAPI(title="GenAI Backend Service", version="0.1.0")
+logger = get_logger(__name__)
+
+app = FastAPI(title="GenAI Backend Service", version="0.1.0", default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -17,30 +30,116 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-@app.on_event("startup")
-async def startup():
-    # Create tables for demo purposes
+def _create_missing_indexes(sync_conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+async def _create_name_search_index():
+    """Trigram GIN index so `full_name ILIKE '%name%'` can use an index instead of a scan."""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        # Create pgvector-backed table for code embeddings (if not exists)
-        if settings.ENABLE_EMBED_INDEX:
+        await lock_schema(conn)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS customers_fullname_trgm "
+                "ON customers USING gin (full_name gin_trgm_ops)"
+            )
+        )
+
+async def _create_vector_index():
+    """HNSW index for inner-product search.
+
+    A column created with the other pgvector type (vector <-> halfvec) is
+    converted in place before the index is built. The conversion rewrites
+    every row anyway, so it also rescales rows indexed before embeddings were
+    unit length (such tables predate halfvec storage and are converted once).
+    """
+    emb_type = settings.embedding_type
+    async with engine.begin() as conn:
+        await lock_schema(conn)
+        current_type = (
+            await conn.execute(
+                text(
+                    "SELECT atttypid::regtype::text FROM pg_attribute "
+                    "WHERE attrelid = 'code_chunks'::regclass AND attname = 'embedding'"
+                )
+            )
+        ).scalar()
+        if current_type and current_type != emb_type:
+            logger.info(f"Converting code_chunks.embedding from {current_type} to {emb_type}")
+            # The old index uses the old type's operator class
+            await conn.execute(text(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}"))
             await conn.execute(
                 text(
-                    f"""
-                    CREATE TABLE IF NOT EXISTS code_chunks (
-                        id SERIAL PRIMARY KEY,
-                        repo TEXT NOT NULL,
-                        path TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding vector({settings.EMBEDDING_DIM}),
-                        updated_at TIMESTAMPTZ DEFAULT NOW()
-                    );
-                    """
+                    f"ALTER TABLE code_chunks ALTER COLUMN embedding TYPE {emb_type}({settings.EMBEDDING_DIM}) "
+                    f"USING l2_normalize(embedding::vector)::{emb_type}({settings.EMBEDDING_DIM})"
                 )
             )
+        elif await vector_index_is_invalid(conn):
+            # Left by an interrupted CONCURRENTLY build in the indexer
+            await conn.execute(text(f"DROP INDEX {VECTOR_INDEX_NAME}"))
+        await conn.execute(text(vector_index_sql()))
+
+@app.on_event("startup")
+async def startup():
+    # Pooled client shared by the GitHub retriever and embedding calls
+    app.state.http = get_http_client()
+
+    # Ollama discovery is async and runs here rather than at import time
+    await registry.refresh_ollama_models()
+    # Compile the re-ranking kernel (no-op without numba) off the event loop
+    await asyncio.to_thread(scoring.warmup)
+
+    # Create tables for demo purposes; workers start together, so DDL runs under the schema lock
+    async with engine.begin() as conn:
+        await lock_schema(conn)
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, so add indexes declared after they were created
+        await conn.run_sync(_create_missing_indexes)
+
+    if settings.ENABLE_EMBED_INDEX:
+        # pgvector-backed table for code embeddings
+        await ensure_code_chunks_schema()
+        try:
+            await _create_vector_index()
+        except Exception as e:
+            logger.warning(f"HNSW index on code_chunks.embedding skipped: {e}")
+        try:
+            await get_embedding_column_dim()
+        except Exception as e:
+            logger.warning(f"Embedding dimension check skipped: {e}")
+
+    # Separate transaction: pg_trgm may not be installable (e.g. missing privileges)
+    try:
+        await _create_name_search_index()
+    except Exception as e:
+        logger.warning(f"Trigram index on customers.full_name skipped: {e}")
+
+    # Warm the customer-name index so the first query does not pay for loading it
+    try:
+        async with AsyncSessionLocal() as session:
+            await customer_index.refresh(DataRepository(session))
+    except Exception as e:
+        logger.warning(f"Customer name index warm-up skipped: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_retrievers()
+    await close_http_client()
 
 app.include_router(router)
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # loop/http "auto" pick uvloop and httptools (uvicorn[standard]) where the platform supports them
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=settings.SERVER_RELOAD,
+        workers=None if settings.SERVER_RELOAD else (settings.SERVER_WORKERS or os.cpu_count()),
+        loop="auto",
+        http="auto",
+    )
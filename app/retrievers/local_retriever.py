@@ -1,8 +1,14 @@
+import asyncio
 import os
+import shutil
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
+import orjson
 from pydantic import BaseModel
 
+# ripgrep is optional; keyword search falls back to a Python scan without it
+RG_PATH = shutil.which("rg")
+
 
 class CodeSnippet(BaseModel):
     path: str
@@ -14,6 +20,8 @@ class CodeSnippet(BaseModel):
 
 class LogicRetriever:
     """Base abstraction for logic retrieval."""
+    uses_intent = True  # results depend on the extracted intent
+
     async def retrieve_logic_snippets(self, user_query: str, intent: str = "general_query") -> List[CodeSnippet]:
         raise NotImplementedError
 
@@ -28,6 +36,9 @@ class LocalRepoRetriever(LogicRetriever):
             workspace_root = Path(__file__).parent.parent.parent
             repo_path = workspace_root / "sample_code_repo-main" / "src"
         self.repo_path = Path(repo_path)
+        # filename -> first path found, and all .py files; built on first use (see refresh)
+        self._file_index: Optional[Dict[str, Path]] = None
+        self._py_files: List[Path] = []
 
         # Static role mapping (domain-specific). Left unchanged intentionally.
         self.role_map = {
@@ -41,6 +52,24 @@ class LocalRepoRetriever(LogicRetriever):
             "model": ["dummy_model.py"],
         }
 
+    def refresh(self) -> None:
+        """(Re)walk repo_path once; call after files in the repo change."""
+        file_index: Dict[str, Path] = {}
+        py_files: List[Path] = []
+        for root, _dirs, files in os.walk(self.repo_path):
+            for file in files:
+                filepath = Path(root) / file
+                file_index.setdefault(file, filepath)
+                if file.endswith(".py"):
+                    py_files.append(filepath)
+        self._file_index = file_index
+        self._py_files = py_files
+
+    def _ensure_index(self) -> Dict[str, Path]:
+        if self._file_index is None:
+            self.refresh()
+        return self._file_index
+
     async def retrieve_logic_snippets(self, user_query: str, intent: str = "general_query") -> List[CodeSnippet]:
         print(f"  [Local] Repo Path: {self.repo_path}")
         print(f"  [Local] Query Intent: {intent}")
@@ -57,7 +86,7 @@ class LocalRepoRetriever(LogicRetriever):
 
         if not snippets:
             print("  [Local] No priority matches, performing keyword search...")
-            snippets = self._keyword_search(user_query)
+            snippets = await self._keyword_search(user_query)
 
         return snippets[:5]
 
@@ -81,46 +110,112 @@ class LocalRepoRetriever(LogicRetriever):
         return roles
 
     def _read_file_by_name(self, filename: str, role: str) -> Optional[CodeSnippet]:
-        for root, _dirs, files in os.walk(self.repo_path):
-            if filename in files:
-                filepath = Path(root) / filename
-                try:
-                    content = filepath.read_text(encoding="utf-8")
-                    relative_path = filepath.relative_to(self.repo_path.parent)
-                    print(f"    [Local] ✓ Loaded: {relative_path} (role: {role})")
-                    return CodeSnippet(
-                        path=str(relative_path),
-                        content=content[:2000],
-                        url=f"file://{filepath}",
-                        role=role,
-                    )
-                except Exception as e:  # pragma: no cover - defensive
-                    print(f"    [Local] ✗ Error reading {filename}: {e}")
+        filepath = self._ensure_index().get(filename)
+        if filepath is None:
+            return None
+        try:
+            content = filepath.read_text(encoding="utf-8")
+            relative_path = filepath.relative_to(self.repo_path.parent)
+            print(f"    [Local] ✓ Loaded: {relative_path} (role: {role})")
+            return CodeSnippet(
+                path=str(relative_path),
+                content=content[:2000],
+                url=f"file://{filepath}",
+                role=role,
+            )
+        except Exception as e:  # pragma: no cover - defensive
+            print(f"    [Local] ✗ Error reading {filename}: {e}")
         return None
 
-    def _keyword_search(self, query: str) -> List[CodeSnippet]:
-        keywords = [w.lower() for w in query.split() if len(w) > 3]
+    async def _keyword_search(self, query: str) -> List[CodeSnippet]:
+        keywords = list(dict.fromkeys(w.lower() for w in query.split() if len(w) > 3))
+        if RG_PATH and keywords:
+            try:
+                return await self._keyword_search_rg(keywords)
+            except Exception as e:
+                print(f"  [Local] ripgrep search failed ({e}), scanning files in Python")
+        return self._keyword_search_python(keywords)
+
+    async def _rg_keyword_matches(self, keywords: List[str]) -> Dict[str, Set[str]]:
+        """Distinct keywords (case-insensitive, literal) found in each indexed .py file, in one rg run.
+
+        rg walks repo_path itself (a file list on the command line can exceed
+        ARG_MAX on large repos); its results are limited to the cached files.
+        """
+        files = {str(path) for path in self._py_files}
+        if not files:
+            return {}
+        args = [RG_PATH, "--json", "--ignore-case", "--fixed-strings", "--no-ignore", "--hidden", "--glob", "*.py"]
+        for keyword in keywords:
+            args += ["-e", keyword]
+        proc = await asyncio.create_subprocess_exec(
+            *args, "--", str(self.repo_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+        if proc.returncode not in (0, 1):  # 1 = no matches
+            raise RuntimeError(stderr.decode("utf-8", errors="ignore").strip() or f"rg exited with {proc.returncode}")
+        found: Dict[str, Set[str]] = {}
+        for line in stdout.splitlines():
+            event = orjson.loads(line)
+            if event["type"] != "match":
+                continue
+            data = event["data"]
+            # Each matching line is reported once, so test every keyword against it
+            # (submatches only show the leftmost of overlapping keywords)
+            text = data["lines"].get("text", "").lower()
+            hits = {kw for kw in keywords if kw in text}
+            path = data["path"]["text"]
+            if hits and path in files:
+                found.setdefault(path, set()).update(hits)
+        return found
+
+    async def _keyword_search_rg(self, keywords: List[str]) -> List[CodeSnippet]:
+        """Same scoring as the Python scan (distinct keywords per file) over the cached file list."""
+        self._ensure_index()
+        found = await self._rg_keyword_matches(keywords)
+        matches = {path: len(hits) for path, hits in found.items()}
         snippets: List[CodeSnippet] = []
-        for root, _dirs, files in os.walk(self.repo_path):
-            for file in files:
-                if file.endswith(".py"):
-                    filepath = Path(root) / file
-                    try:
-                        content = filepath.read_text(encoding="utf-8")
-                        content_lower = content.lower()
-                        matches = sum(1 for kw in keywords if kw in content_lower)
-                        if matches > 0:
-                            relative_path = filepath.relative_to(self.repo_path.parent)
-                            snippets.append(
-                                CodeSnippet(
-                                    path=str(relative_path),
-                                    content=content[:2000],
-                                    url=f"file://{filepath}",
-                                    score=float(matches),
-                                    role="general",
-                                )
-                            )
-                    except Exception:
-                        pass
+        for path in sorted(matches):
+            filepath = Path(path)
+            try:
+                content = filepath.read_text(encoding="utf-8")
+            except Exception:
+                continue
+            relative_path = filepath.relative_to(self.repo_path.parent)
+            snippets.append(
+                CodeSnippet(
+                    path=str(relative_path),
+                    content=content[:2000],
+                    url=f"file://{filepath}",
+                    score=float(matches[path]),
+                    role="general",
+                )
+            )
+        snippets.sort(key=lambda x: x.score or 0, reverse=True)
+        return snippets
+
+    def _keyword_search_python(self, keywords: List[str]) -> List[CodeSnippet]:
+        snippets: List[CodeSnippet] = []
+        self._ensure_index()
+        for filepath in self._py_files:
+            try:
+                content = filepath.read_text(encoding="utf-8")
+                content_lower = content.lower()
+                matches = sum(1 for kw in keywords if kw in content_lower)
+                if matches > 0:
+                    relative_path = filepath.relative_to(self.repo_path.parent)
+                    snippets.append(
+                        CodeSnippet(
+                            path=str(relative_path),
+                            content=content[:2000],
+                            url=f"file://{filepath}",
+                            score=float(matches),
+                            role="general",
+                        )
+                    )
+            except Exception:
+                pass
         snippets.sort(key=lambda x: x.score or 0, reverse=True)
         return snippets
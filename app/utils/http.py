@@ -0,0 +1,89 @@
+"""Shared long-lived HTTP client for outbound API calls (GitHub, embeddings).
+
+One pooled HTTP/2 client keeps TLS connections to api.github.com and the
+embedding providers alive across requests (retriever, indexers, incremental
+checks). It is created lazily, opened in the FastAPI startup hook and closed
+on shutdown (or at the end of run_indexer.py).
+
+Rate-limited responses are retried inside the transport, after the wait the
+server advertises, so callers only see them once retries are exhausted.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+import httpx
+from app.config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _rate_limit_wait(response: httpx.Response, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a rate-limited response, or None if it is not one."""
+    if response.status_code not in (403, 429):
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            return None  # HTTP-date form; not used by GitHub or the embedding APIs
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset is not None and reset.isdigit():
+            return max(int(reset) - time.time(), 0.0) + 1
+    if response.status_code == 429:
+        return 2.0 ** attempt
+    return None  # plain 403: permissions, not a limit
+
+
+class RateLimitRetryTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport and retries 429s and GitHub rate-limit 403s after the advertised wait."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_retries: int, max_wait: float):
+        self._transport = transport
+        self._max_retries = max_retries
+        self._max_wait = max_wait
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            response = await self._transport.handle_async_request(request)
+            wait = _rate_limit_wait(response, attempt)
+            if wait is None or attempt >= self._max_retries or wait > self._max_wait:
+                return response
+            await response.aclose()
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, (re)creating it if it was never opened or has been closed."""
+    global _client
+    if _client is None or _client.is_closed:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+            retries=3,  # connection failures only
+        )
+        _client = httpx.AsyncClient(
+            timeout=40,
+            transport=RateLimitRetryTransport(
+                transport, settings.HTTP_RATE_LIMIT_RETRIES, settings.HTTP_RATE_LIMIT_MAX_WAIT
+            ),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def github_headers() -> Dict[str, str]:
+    """Per-request GitHub REST headers (the shared client also talks to embedding providers, so no default auth)."""
+    return {"Authorization": f"Bearer {settings.GITHUB_TOKEN}", "Accept": "application/vnd.github+json"}
@@ -32,6 +32,9 @@ SIMPLE_FORMAT = logging.Formatter(
     fmt='%(levelname)-8s | %(message)s'
 )
 
+# Configured loggers by (name, log_file), so repeat calls skip setup entirely
+_LOGGER_CACHE: dict[tuple[str, Optional[Path]], logging.Logger] = {}
+
 
 def get_logger(name: str, log_file: Optional[Path] = None) -> logging.Logger:
     """Get or create a logger with file and console handlers.
@@ -43,7 +46,13 @@ def get_logger(name: str, log_file: Optional[Path] = None) -> logging.Logger:
     Returns:
         Configured logger instance
     """
+    key = (name, log_file)
+    cached = _LOGGER_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     logger = logging.getLogger(name)
+    _LOGGER_CACHE[key] = logger
     
     # Avoid duplicate handlers
     if logger.handlers:
@@ -75,7 +84,13 @@ def get_logger(name: str, log_file: Optional[Path] = None) -> logging.Logger:
 
 def get_query_logger() -> logging.Logger:
     """Get specialized logger for query analytics."""
+    key = ("query_analytics", QUERY_LOG)
+    cached = _LOGGER_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     logger = logging.getLogger("query_analytics")
+    _LOGGER_CACHE[key] = logger
     
     if logger.handlers:
         return logger
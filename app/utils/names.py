@@ -0,0 +1,14 @@
+"""Matching known entity names in free text."""
+import re
+from typing import Iterable, Optional, Pattern
+
+
+def build_name_pattern(names: Iterable[str]) -> Optional[Pattern]:
+    """Compile known customer names into one case-insensitive alternation.
+
+    Longest names come first so "Ann Lee" wins over "Ann" when both exist.
+    """
+    unique = sorted({n.strip() for n in names if n and n.strip()}, key=len, reverse=True)
+    if not unique:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(n) for n in unique) + r")\b", re.IGNORECASE)
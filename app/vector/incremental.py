@@ -1,17 +1,27 @@
 """Incremental indexing support with GitHub commit tracking."""
 from __future__ import annotations
+import asyncio
+import hashlib
+import time
 import httpx
-from typing import List, Optional, Set
+import numpy as np
+import orjson
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
 from sqlalchemy import text
 from app.config import settings
-from app.db.session import AsyncSessionLocal
+from app.db.session import AsyncSessionLocal, engine
+from app.utils.http import get_http_client, github_headers
 from app.utils.logger import get_indexer_logger
 
 logger = get_indexer_logger()
 
+# github_etag_cache rows not refreshed by a 200 for this long are pruned
+ETAG_CACHE_MAX_AGE_DAYS = 30
+
 
 async def ensure_metadata_table():
-    """Create indexer_metadata table if it doesn't exist."""
+    """Create indexer_metadata and github_etag_cache tables if they don't exist."""
     async with AsyncSessionLocal() as session:
         await session.execute(text("""
             CREATE TABLE IF NOT EXISTS indexer_metadata (
@@ -22,9 +32,139 @@ async def ensure_metadata_table():
                 total_chunks INTEGER DEFAULT 0
             );
         """))
+        await _ensure_embedding_cache_table(session)
+        await session.execute(text("""
+            CREATE TABLE IF NOT EXISTS github_etag_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body TEXT NOT NULL,
+                fetched_at TIMESTAMPTZ DEFAULT NOW()
+            );
+        """))
+        # Entries for URLs no longer requested (old branches, SHA-addressed trees cached by
+        # earlier versions) would otherwise stay forever
+        await session.execute(
+            text(f"DELETE FROM github_etag_cache WHERE fetched_at < NOW() - INTERVAL '{ETAG_CACHE_MAX_AGE_DAYS} days'")
+        )
         await session.commit()
 
 
+async def _ensure_embedding_cache_table(session):
+    """chunk_embedding_cache, recreated when its column type/dimension no longer matches settings."""
+    column_type = f"{settings.embedding_type}({settings.EMBEDDING_DIM})"
+    result = await session.execute(text("""
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = to_regclass('chunk_embedding_cache') AND attname = 'embedding'
+    """))
+    existing_type = result.scalar()
+    if existing_type is not None and existing_type != column_type:
+        logger.info(f"chunk_embedding_cache type changed ({existing_type} -> {column_type}), recreating")
+        await session.execute(text("DROP TABLE chunk_embedding_cache"))
+    await session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS chunk_embedding_cache (
+            hash BYTEA PRIMARY KEY,
+            embedding {column_type} NOT NULL
+        );
+    """))
+
+
+def chunk_cache_key(chunk: str) -> bytes:
+    """Embedding-cache key for a chunk; includes the embedding config so a model switch never reuses vectors."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (settings.EMBEDDING_PROVIDER.lower(), settings.EMBEDDING_MODEL, str(settings.EMBEDDING_DIM), chunk):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.digest()
+
+
+async def get_cached_embeddings(keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+    """Embeddings previously stored for these chunk keys (misses are absent)."""
+    if not keys:
+        return {}
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                text("SELECT hash, embedding FROM chunk_embedding_cache WHERE hash = ANY(:keys)"),
+                {"keys": list(keys)}
+            )
+            # The pgvector codec decodes to Vector/HalfVector
+            return {bytes(row[0]): row[1].to_numpy() for row in result.fetchall()}
+    except Exception as e:
+        logger.debug(f"Embedding cache lookup skipped: {e}")
+        return {}
+
+
+async def store_cached_embeddings(entries: Sequence[Tuple[bytes, np.ndarray]]):
+    if not entries:
+        return
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                text("INSERT INTO chunk_embedding_cache (hash, embedding) VALUES (:hash, :embedding) ON CONFLICT DO NOTHING"),
+                [{"hash": key, "embedding": embedding} for key, embedding in entries]
+            )
+            await session.commit()
+    except Exception as e:
+        logger.debug(f"Embedding cache store skipped: {e}")
+
+
+async def _get_cached_response(url: str) -> Optional[Tuple[str, str]]:
+    """(etag, body) stored for a GitHub API URL, or None."""
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                text("SELECT etag, body FROM github_etag_cache WHERE url = :url"),
+                {"url": url}
+            )
+            row = result.fetchone()
+            return (row[0], row[1]) if row else None
+    except Exception as e:
+        logger.debug(f"ETag cache lookup skipped for {url}: {e}")
+        return None
+
+
+async def _store_cached_response(url: str, etag: str, body: str):
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("""
+                INSERT INTO github_etag_cache (url, etag, body, fetched_at)
+                VALUES (:url, :etag, :body, NOW())
+                ON CONFLICT (url) DO UPDATE
+                SET etag = :etag, body = :body, fetched_at = NOW()
+            """), {"url": url, "etag": etag, "body": body})
+            await session.commit()
+    except Exception as e:
+        logger.debug(f"ETag cache store skipped for {url}: {e}")
+
+
+async def conditional_get_json(client: httpx.AsyncClient, url: str, headers: dict) -> tuple[int, Any, str]:
+    """GET a GitHub API URL with If-None-Match from the last 200 response.
+    
+    A 304 Not Modified has no body and does not count against the primary
+    rate limit; the cached JSON is returned in its place. Only for URLs whose
+    response changes (branch refs, trees by branch name): every URL keeps a row
+    with its full body, and SHA-addressed resources never need revalidating.
+    
+    Returns:
+        (status_code, data, error_text) - data is None unless status_code is 200
+    """
+    cached = await _get_cached_response(url)
+    request_headers = dict(headers)
+    if cached:
+        request_headers["If-None-Match"] = cached[0]
+    
+    resp = await client.get(url, headers=request_headers)
+    if resp.status_code == 304 and cached:
+        return 200, orjson.loads(cached[1]), ""
+    if resp.status_code != 200:
+        return resp.status_code, None, resp.text[:200]
+    
+    etag = resp.headers.get("ETag")
+    if etag:
+        await _store_cached_response(url, etag, resp.text)
+    return 200, orjson.loads(resp.content), ""
+
+
 async def get_last_indexed_commit(repo: str) -> Optional[str]:
     """Get the last indexed commit SHA for a repository."""
     async with AsyncSessionLocal() as session:
@@ -51,26 +191,122 @@ async def update_indexed_commit(repo: str, commit_sha: str, total_files: int, to
         await session.commit()
 
 
+_COMMIT_SHA_QUERY = """
+query($owner: String!, $name: String!, $qualifiedName: String!, $isHead: Boolean!) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef @include(if: $isHead) { target { oid } }
+    ref(qualifiedName: $qualifiedName) @skip(if: $isHead) { target { oid } }
+  }
+}
+"""
+
+
+async def _fetch_commit_sha_graphql(client: httpx.AsyncClient, owner: str, name: str, branch: str) -> Optional[str]:
+    """Branch (or default branch for HEAD) tip SHA in one GraphQL request; None on failure."""
+    variables = {
+        "owner": owner,
+        "name": name,
+        "qualifiedName": f"refs/heads/{branch}",
+        "isHead": branch == "HEAD",
+    }
+    resp = await client.post(
+        "https://api.github.com/graphql",
+        content=orjson.dumps({"query": _COMMIT_SHA_QUERY, "variables": variables}),
+        headers={**github_headers(), "Content-Type": "application/json"},
+    )
+    if resp.status_code != 200:
+        logger.debug(f"GraphQL commit lookup failed: {resp.status_code} {resp.text[:200]}")
+        return None
+    repository = (orjson.loads(resp.content).get("data") or {}).get("repository") or {}
+    ref = repository.get("defaultBranchRef") or repository.get("ref") or {}
+    return (ref.get("target") or {}).get("oid")
+
+
 async def fetch_current_commit_sha(owner: str, name: str, branch: str = "HEAD") -> str:
-    """Get the current commit SHA for a branch from GitHub."""
+    """Get the current commit SHA for a branch from GitHub.
+    
+    One GraphQL request resolves the default branch and its tip together;
+    the REST fallback needs two (conditional) requests.
+    """
+    client = get_http_client()
+    try:
+        sha = await _fetch_commit_sha_graphql(client, owner, name, branch)
+        if sha:
+            return sha
+    except Exception as e:
+        logger.debug(f"GraphQL commit lookup failed: {e}")
+    
     # Handle HEAD by fetching default branch
     if branch == "HEAD":
         # Get default branch first
         repo_url = f"https://api.github.com/repos/{owner}/{name}"
-        async with httpx.AsyncClient(timeout=30) as client:
-            headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-            repo_resp = await client.get(repo_url, headers=headers)
-            if repo_resp.status_code == 200:
-                branch = repo_resp.json().get("default_branch", "main")
+        status, repo_data, _ = await conditional_get_json(client, repo_url, github_headers())
+        if status == 200:
+            branch = repo_data.get("default_branch", "main")
     
     url = f"https://api.github.com/repos/{owner}/{name}/git/refs/heads/{branch}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-        resp = await client.get(url, headers=headers)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Failed to fetch commit SHA: {resp.status_code} {resp.text[:200]}")
-        data = resp.json()
-        return data["object"]["sha"]
+    status, data, error_text = await conditional_get_json(client, url, github_headers())
+    if status != 200:
+        raise RuntimeError(f"Failed to fetch commit SHA: {status} {error_text}")
+    return data["object"]["sha"]
+
+
+# compare-API file statuses whose new content must be (re)indexed
+CHANGED_STATUSES = frozenset({"added", "modified", "renamed"})
+# The compare API lists at most this many files and cannot page past them
+COMPARE_FILES_CAP = 300
+
+
+def is_indexed_path(path: str) -> bool:
+    """Python files outside INDEX_EXCLUDE_PREFIXES."""
+    return path.endswith(".py") and not path.startswith(settings.index_exclude_prefixes)
+
+
+def is_indexed_blob(item: Dict[str, Any]) -> bool:
+    """is_indexed_path() for a Trees API entry, also skipping blobs under INDEX_MIN_FILE_BYTES.
+    
+    The tree lists each blob's size, so empty __init__.py files and stubs are
+    dropped before any fetch. Full indexes only: compare-API listings carry no
+    sizes, so change detection in both modes uses is_indexed_path() alone and
+    a file edited down below the minimum is re-indexed, not deleted.
+    """
+    return (
+        item.get("type") == "blob"
+        and item.get("size", settings.INDEX_MIN_FILE_BYTES) >= settings.INDEX_MIN_FILE_BYTES
+        and is_indexed_path(item["path"])
+    )
+
+
+async def fetch_python_blobs(owner: str, name: str, tree_ish: str) -> Dict[str, str]:
+    """{path: blob_sha} for every .py file outside INDEX_EXCLUDE_PREFIXES at a commit, from one recursive Trees API call.
+    
+    Raises RuntimeError if GitHub truncated the tree (~100k entries), since a
+    partial listing would make files look deleted.
+    """
+    url = f"https://api.github.com/repos/{owner}/{name}/git/trees/{tree_ish}?recursive=1"
+    # Called with commit SHAs, whose trees never change: not worth an ETag cache row
+    resp = await get_http_client().get(url, headers=github_headers())
+    if resp.status_code != 200:
+        raise RuntimeError(f"Tree fetch error {resp.status_code}: {resp.text[:200]}")
+    tree = orjson.loads(resp.content)
+    if tree.get("truncated"):
+        raise RuntimeError(f"Tree for {tree_ish[:7]} truncated by GitHub")
+    return {
+        item["path"]: item["sha"]
+        for item in tree.get("tree", ())
+        # Path filter only, as in compare mode (see is_indexed_blob)
+        if item.get("type") == "blob" and is_indexed_path(item["path"])
+    }
+
+
+async def _diff_python_trees(owner: str, name: str, base_sha: str, head_sha: str) -> tuple[Set[str], Set[str]]:
+    """fetch_changed_files() by comparing blob SHAs of both trees (no file-count cap)."""
+    base, head = await asyncio.gather(
+        fetch_python_blobs(owner, name, base_sha),
+        fetch_python_blobs(owner, name, head_sha)
+    )
+    changed_paths = {path for path, sha in head.items() if base.get(path) != sha}
+    return changed_paths, set(base.keys() - head.keys())
 
 
 async def fetch_changed_files(owner: str, name: str, base_sha: str, head_sha: str) -> tuple[Set[str], Set[str]]:
@@ -80,31 +316,25 @@ async def fetch_changed_files(owner: str, name: str, base_sha: str, head_sha: st
         (changed_files, deleted_files) - both are sets of file paths
     """
     url = f"https://api.github.com/repos/{owner}/{name}/compare/{base_sha}...{head_sha}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-        resp = await client.get(url, headers=headers)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Failed to compare commits: {resp.status_code} {resp.text[:200]}")
-        
-        data = resp.json()
-        changed_paths = set()
-        deleted_paths = set()
-        
-        for file_data in data.get("files", []):
-            path = file_data["filename"]
-            if not path.endswith(".py"):
-                continue
-            
-            status = file_data["status"]
-            if status in ["added", "modified", "renamed"]:
-                changed_paths.add(path)
-                # Handle renames: remove old path
-                if status == "renamed" and "previous_filename" in file_data:
-                    deleted_paths.add(file_data["previous_filename"])
-            elif status == "removed":
-                deleted_paths.add(path)
-        
-        return changed_paths, deleted_paths
+    resp = await get_http_client().get(url, headers=github_headers())
+    if resp.status_code != 200:
+        raise RuntimeError(f"Failed to compare commits: {resp.status_code} {resp.text[:200]}")
+    
+    data = orjson.loads(resp.content)
+    files = data.get("files", ())
+    if len(files) >= COMPARE_FILES_CAP:
+        # Listing may be cut off; diff the two commits' trees instead
+        logger.info(f"Compare lists {len(files)} files (API cap), diffing trees instead")
+        return await _diff_python_trees(owner, name, base_sha, head_sha)
+    changed_paths = {f["filename"] for f in files if f["status"] in CHANGED_STATUSES and is_indexed_path(f["filename"])}
+    deleted_paths = {f["filename"] for f in files if f["status"] == "removed" and f["filename"].endswith(".py")}
+    # Renames: drop chunks under the old path (even if the new name is no longer .py)
+    deleted_paths.update(
+        f["previous_filename"] for f in files
+        if f["status"] == "renamed" and f.get("previous_filename", "").endswith(".py")
+    )
+    
+    return changed_paths, deleted_paths
 
 
 async def delete_chunks_for_files(repo: str, file_paths: Set[str]):
@@ -112,17 +342,212 @@ async def delete_chunks_for_files(repo: str, file_paths: Set[str]):
     if not file_paths:
         return
     
-    async with AsyncSessionLocal() as session:
-        for path in file_paths:
-            await session.execute(
-                text("DELETE FROM code_chunks WHERE repo = :repo AND path = :path"),
-                {"repo": repo, "path": path}
+    # Write-only path: a pooled Core connection (raw asyncpg when available), no ORM session
+    async with engine.begin() as conn:
+        if conn.dialect.driver == "asyncpg":
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            await raw_conn.execute(
+                "DELETE FROM code_chunks WHERE repo = $1 AND path = ANY($2::text[])",
+                repo, list(file_paths)
+            )
+        else:
+            await conn.execute(
+                text("DELETE FROM code_chunks WHERE repo = :repo AND path = ANY(:paths)"),
+                {"repo": repo, "paths": list(file_paths)}
             )
-        await session.commit()
     
     logger.info(f"Deleted chunks for {len(file_paths)} removed/renamed files")
 
 
+VECTOR_INDEX_NAME = "code_chunks_embedding_hnsw"
+
+
+def vector_index_sql(concurrently: bool = False) -> str:
+    """CREATE INDEX statement for the HNSW inner-product index on code_chunks.embedding."""
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {VECTOR_INDEX_NAME} "
+        f"ON code_chunks USING hnsw (embedding {settings.embedding_type}_ip_ops) WITH (m = 16, ef_construction = 64)"
+    )
+
+
+async def vector_index_is_invalid(conn) -> bool:
+    """True if VECTOR_INDEX_NAME exists but is INVALID (left by a failed or cancelled CONCURRENTLY build).
+    
+    CREATE INDEX IF NOT EXISTS skips such an index although the planner never
+    uses it, so it must be dropped before rebuilding.
+    """
+    return bool(
+        (
+            await conn.execute(
+                text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                {"name": VECTOR_INDEX_NAME}
+            )
+        ).scalar()
+    )
+
+
+async def drop_vector_index():
+    """Drop the HNSW index ahead of a bulk load.
+    
+    Maintaining HNSW per inserted row costs far more than one build over the
+    loaded table; call build_vector_index() afterwards.
+    """
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}"))
+    logger.info(f"Dropped {VECTOR_INDEX_NAME} for bulk load ({time.perf_counter() - started:.1f}s)")
+
+
+async def build_vector_index():
+    """Build the HNSW index after a bulk load, CONCURRENTLY so readers are not blocked."""
+    started = time.perf_counter()
+    drop_sql = text(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}")
+    async with engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await vector_index_is_invalid(conn):
+            logger.warning(f"Dropping invalid {VECTOR_INDEX_NAME} left by an earlier build")
+            await conn.execute(drop_sql)
+        try:
+            await conn.execute(text(vector_index_sql(concurrently=True)))
+        except BaseException:
+            # A failed or cancelled build leaves an INVALID index that IF NOT EXISTS would keep skipping
+            try:
+                await conn.execute(drop_sql)
+            except Exception as e:
+                logger.warning(f"Could not drop invalid {VECTOR_INDEX_NAME}: {e}")
+            raise
+    logger.info(f"Built {VECTOR_INDEX_NAME} ({time.perf_counter() - started:.1f}s)")
+
+
+async def get_content_hashes(repo: str, file_paths: Sequence[str]) -> Dict[str, bytes]:
+    """Stored content_hash per path (paths without chunks or hash are absent)."""
+    if not file_paths:
+        return {}
+    
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            text("""
+                SELECT DISTINCT ON (path) path, content_hash FROM code_chunks
+                WHERE repo = :repo AND path = ANY(:paths) AND content_hash IS NOT NULL
+            """),
+            {"repo": repo, "paths": list(file_paths)}
+        )
+        return {row[0]: bytes(row[1]) for row in result.fetchall()}
+
+
+@asynccontextmanager
+async def chunk_loader() -> AsyncIterator[Callable[[Sequence[Tuple[str, str, str, Any, Optional[bytes]]]], Awaitable[None]]]:
+    """One connection and transaction for a load arriving in batches.
+    
+    Yields `load(rows)` for (repo, path, content, embedding, content_hash)
+    rows: a binary COPY on asyncpg (embeddings go through the pgvector codec),
+    one executemany INSERT on other drivers. Everything loaded commits on a
+    clean exit and rolls back if the block raises, so readers never see a
+    partial load.
+    """
+    async with engine.connect() as conn:
+        if conn.dialect.driver == "asyncpg":
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            
+            async def load(rows):
+                await raw_conn.copy_records_to_table(
+                    "code_chunks",
+                    records=rows,
+                    columns=["repo", "path", "content", "embedding", "content_hash"],
+                )
+            
+            async with raw_conn.transaction():
+                yield load
+        else:
+            async def load(rows):
+                await conn.execute(
+                    text("""
+                        INSERT INTO code_chunks (repo, path, content, embedding, content_hash)
+                        VALUES (:repo, :path, :content, :embedding, :content_hash)
+                    """),
+                    [{"repo": r, "path": p, "content": c, "embedding": e, "content_hash": h} for r, p, c, e, h in rows]
+                )
+            
+            async with conn.begin():
+                yield load
+
+
+async def insert_chunks(rows: Sequence[Tuple[str, str, str, Any, Optional[bytes]]]):
+    """Bulk-insert (repo, path, content, embedding, content_hash) rows into code_chunks in one transaction."""
+    if not rows:
+        return
+    
+    async with chunk_loader() as load:
+        await load(rows)
+
+
+# Records the new commit and recounts the repo's chunks in one statement
+_UPDATE_COMMIT_FROM_CHUNKS_SQL = """
+    INSERT INTO indexer_metadata (repo, last_commit_sha, last_indexed_at, total_files, total_chunks)
+    SELECT {repo}, {sha}, NOW(), COUNT(DISTINCT path), COUNT(*) FROM code_chunks WHERE repo = {repo}
+    ON CONFLICT (repo) DO UPDATE
+    SET last_commit_sha = EXCLUDED.last_commit_sha,
+        last_indexed_at = EXCLUDED.last_indexed_at,
+        total_files = EXCLUDED.total_files,
+        total_chunks = EXCLUDED.total_chunks
+    RETURNING total_files, total_chunks
+"""
+
+
+async def replace_file_chunks(
+    repo: str,
+    file_paths: Set[str],
+    rows: Sequence[Tuple[str, str, str, Any, Optional[bytes]]],
+    commit_sha: str
+) -> Tuple[int, int]:
+    """Swap the chunks of `file_paths` for `rows` and record `commit_sha`, in one transaction.
+    
+    Readers never see a file with its old chunks deleted but new ones missing,
+    and a crash cannot leave indexer_metadata ahead of code_chunks.
+    
+    Returns:
+        (file_count, chunk_count) for the repository after the swap
+    """
+    paths = list(file_paths)
+    async with engine.connect() as conn:
+        if conn.dialect.driver == "asyncpg":
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            async with raw_conn.transaction():
+                if paths:
+                    await raw_conn.execute(
+                        "DELETE FROM code_chunks WHERE repo = $1 AND path = ANY($2::text[])", repo, paths
+                    )
+                if rows:
+                    await raw_conn.copy_records_to_table(
+                        "code_chunks",
+                        records=rows,
+                        columns=["repo", "path", "content", "embedding", "content_hash"],
+                    )
+                row = await raw_conn.fetchrow(_UPDATE_COMMIT_FROM_CHUNKS_SQL.format(repo="$1", sha="$2"), repo, commit_sha)
+        else:
+            async with conn.begin():
+                if paths:
+                    await conn.execute(
+                        text("DELETE FROM code_chunks WHERE repo = :repo AND path = ANY(:paths)"),
+                        {"repo": repo, "paths": paths}
+                    )
+                if rows:
+                    await conn.execute(
+                        text("""
+                            INSERT INTO code_chunks (repo, path, content, embedding, content_hash)
+                            VALUES (:repo, :path, :content, :embedding, :content_hash)
+                        """),
+                        [{"repo": r, "path": p, "content": c, "embedding": e, "content_hash": h} for r, p, c, e, h in rows]
+                    )
+                result = await conn.execute(
+                    text(_UPDATE_COMMIT_FROM_CHUNKS_SQL.format(repo=":repo", sha=":sha")),
+                    {"repo": repo, "sha": commit_sha}
+                )
+                row = result.fetchone()
+    return (row[0] or 0, row[1] or 0)
+
+
 async def check_if_reindex_needed(repo: str, branch: str = "HEAD") -> tuple[bool, Optional[str], Optional[str]]:
     """Check if incremental re-indexing is needed.
     
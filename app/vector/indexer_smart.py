@@ -7,30 +7,62 @@ This module provides index_github_repo_smart() which:
 4. Preserves all existing functionality from indexer_v2.py
 """
 from __future__ import annotations
-import ast
+import asyncio
 import base64
+import hashlib
+import os
+import shutil
+import tempfile
 import httpx
-from typing import List, Tuple, Optional
-from sqlalchemy import text
+import numpy as np
+from typing import AsyncIterator, Dict, List, Set, Tuple, Optional
 from app.config import settings
-from app.llm.embeddings import get_embedding
-from app.db.session import AsyncSessionLocal
+from app.utils.http import get_http_client, github_headers
+from app.utils.logger import get_indexer_logger
 from app.vector.incremental import (
     ensure_metadata_table,
+    conditional_get_json,
+    is_indexed_blob,
     get_incremental_file_list,
     delete_chunks_for_files,
+    get_content_hashes,
+    insert_chunks,
+    replace_file_chunks,
+    drop_vector_index,
+    build_vector_index,
     update_indexed_commit,
     get_file_count_stats
 )
-# Import chunking functions from existing indexer
+# Fetching, chunking and embedding helpers shared with the full indexer
 from app.vector.indexer_v2 import (
-    _chunk_code_ast,
-    _is_top_level,
-    _chunk_code_regex,
-    _slice_large,
-    _truncate
+    FETCH_CONCURRENCY,
+    _fetch_file,
+    _download_sources,
+    _embed_with_cache,
+    chunk_code_in_pool
 )
 
+logger = get_indexer_logger()
+
+# Upper bound for each git clone/checkout step of a full index
+GIT_TIMEOUT = 300
+# Pipeline stages: AST chunking runs in the indexer_v2 process pool (one
+# feeder per core), embedding requests take up to EMBED_BATCH_SIZE queued
+# chunks each (Gemini's batch maximum)
+CHUNK_WORKERS = os.cpu_count() or 4
+EMBED_WORKERS = 4
+EMBED_BATCH_SIZE = 100
+# Per-file results go to the indexer log; the console gets a progress line every N files
+PROGRESS_EVERY = 25
+
+# (repo, path, content, embedding, content_hash) as stored in code_chunks
+ChunkRow = Tuple[str, str, str, np.ndarray, bytes]
+
+
+def content_hash(source: str) -> bytes:
+    """Digest of a file's source, stored with its chunks to detect no-op changes."""
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).digest()
+
 
 async def index_github_repo_smart(
     repo: str | None = None,
@@ -99,82 +131,216 @@ async def index_github_repo_smart(
     return await _index_all_files(repo, branch, file_limit)
 
 
-async def _index_specific_files(
+async def _process_files(
+    client: httpx.AsyncClient,
+    headers: dict,
     repo: str,
-    branch: str,
-    file_paths: List[str],
-    commit_sha: str,
-    file_limit: int
-) -> dict:
-    """Index only specific files (incremental mode)."""
-    owner, name = repo.split("/", 1)
-    chunks_to_insert: List[Tuple[str, str, str, str]] = []
+    paths: List[str],
+    known_hashes: Optional[Dict[str, bytes]] = None
+) -> Tuple[List[ChunkRow], Set[str]]:
+    """Fetch files concurrently and feed each into the chunk/embed pipeline as it arrives."""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
     
-    async with httpx.AsyncClient(timeout=90) as client:
-        headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-        
-        # Process only changed files
-        for idx, path in enumerate(file_paths[:file_limit], 1):
-            print(f"[{idx}/{len(file_paths)}] Processing {path}...", end=" ")
-            contents_url = f"https://api.github.com/repos/{owner}/{name}/contents/{path}"
-            
+    async def fetch_one(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+        raw, error = await _fetch_file(client, semaphore, headers, repo, path)
+        return path, raw, error
+    
+    async def fetched() -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+        for next_done in asyncio.as_completed([fetch_one(p) for p in paths]):
+            yield await next_done
+    
+    return await _run_pipeline(repo, len(paths), fetched(), known_hashes)
+
+
+async def _process_sources(
+    repo: str,
+    paths: List[str],
+    sources: Dict[str, str]
+) -> Tuple[List[ChunkRow], Set[str]]:
+    """Chunk and embed files whose contents are already local (e.g. from the tarball)."""
+    async def local() -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+        for path in paths:
+            raw = sources.get(path)
+            yield path, raw, None if raw is not None else "not in archive"
+    
+    return await _run_pipeline(repo, len(paths), local())
+
+
+async def _run_pipeline(
+    repo: str,
+    total: int,
+    files: AsyncIterator[Tuple[str, Optional[str], Optional[str]]],
+    known_hashes: Optional[Dict[str, bytes]] = None
+) -> Tuple[List[ChunkRow], Set[str]]:
+    """files -> AST chunking -> batched embedding, stages linked by bounded queues.
+    
+    `files` yields (path, source, error) as sources become available, so
+    fetching, chunking and embedding requests overlap instead of running in
+    turn. Files whose content hash equals `known_hashes[path]` are skipped.
+    
+    Returns:
+        (rows, unchanged_paths) - rows in completion order
+    """
+    known_hashes = known_hashes or {}
+    file_q: asyncio.Queue = asyncio.Queue(maxsize=32)
+    chunk_q: asyncio.Queue = asyncio.Queue(maxsize=256)
+    rows: List[ChunkRow] = []
+    unchanged: Set[str] = set()
+    done_files = 0
+    
+    def report(path: str, status: str, failed: bool = False):
+        nonlocal done_files
+        done_files += 1
+        if failed:
+            logger.warning(f"[{done_files}/{total}] {path} {status}")
+        else:
+            logger.debug(f"[{done_files}/{total}] {path} {status}")
+        if done_files % PROGRESS_EVERY == 0 or done_files == total:
+            logger.info(f"Chunked {done_files}/{total} files")
+            print(f"[Indexer] Chunked {done_files}/{total} files")
+    
+    async def chunker():
+        while True:
+            path, raw, error = await file_q.get()
             try:
-                c_resp = await client.get(contents_url, headers=headers)
-                if c_resp.status_code != 200:
-                    print(f"✗ (fetch error {c_resp.status_code})")
+                if error:
+                    report(path, f"✗ ({error})", failed=True)
+                    continue
+                file_hash = content_hash(raw)
+                if known_hashes.get(path) == file_hash:
+                    unchanged.add(path)
+                    report(path, "= (content unchanged)")
                     continue
-                
-                c_data = c_resp.json()
-                encoded = c_data.get("content")
-                if not encoded:
-                    print("✗ (no content)")
+                try:
+                    # AST parsing is CPU-bound; run it in other processes
+                    chunks = await chunk_code_in_pool(raw, path)
+                except Exception as e:
+                    report(path, f"✗ (error: {e})", failed=True)
                     continue
-                
-                raw = base64.b64decode(encoded).decode("utf-8", errors="ignore")
-                
-                # Parse with AST (uses existing function from indexer_v2)
-                chunks = _chunk_code_ast(raw, path)
                 if not chunks:
-                    print("✗ (no chunks)")
+                    report(path, "✗ (no chunks)", failed=True)
                     continue
-                
-                # Generate embeddings for each chunk
-                for chunk_content in chunks:
-                    embedding = await get_embedding(chunk_content)
-                    embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
-                    
-                    if len(embedding) != settings.EMBEDDING_DIM:
-                        print(f"⚠ embedding dim={len(embedding)}, expected {settings.EMBEDDING_DIM}")
-                    
-                    chunks_to_insert.append((repo, path, chunk_content, embedding_str))
-                
-                print(f"✓ ({len(chunks)} chunks)")
-            
+                report(path, f"✓ ({len(chunks)} chunks)")
+                for chunk in chunks:
+                    await chunk_q.put((path, chunk, file_hash))
+            finally:
+                file_q.task_done()
+    
+    async def embedder():
+        while True:
+            batch = [await chunk_q.get()]
+            while len(batch) < EMBED_BATCH_SIZE and not chunk_q.empty():
+                batch.append(chunk_q.get_nowait())
+            try:
+                embeddings = await _embed_with_cache([chunk for _, chunk, _ in batch])
+                rows.extend(
+                    (repo, path, chunk_content, embedding, file_hash)
+                    for (path, chunk_content, file_hash), embedding in zip(batch, embeddings)
+                )
             except Exception as e:
-                print(f"✗ (error: {e})")
-                continue
+                logger.error(f"Embedding batch of {len(batch)} chunks failed: {e}")
+            finally:
+                for _ in batch:
+                    chunk_q.task_done()
     
-    # Delete old chunks for these files before inserting new ones
-    print()
-    print(f"[Indexer] Removing old chunks for {len(file_paths)} files...")
-    await delete_chunks_for_files(repo, set(file_paths))
+    workers = [asyncio.create_task(chunker()) for _ in range(CHUNK_WORKERS)]
+    workers += [asyncio.create_task(embedder()) for _ in range(EMBED_WORKERS)]
+    try:
+        async for item in files:
+            await file_q.put(item)
+        await file_q.join()
+        await chunk_q.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
     
-    # Insert new chunks
-    print(f"[Indexer] Inserting {len(chunks_to_insert)} new chunks...")
-    async with AsyncSessionLocal() as session:
-        for repo_val, path_val, content_val, embedding_str_val in chunks_to_insert:
-            await session.execute(
-                text("""
-                    INSERT INTO code_chunks (repo, path, content, embedding) 
-                    VALUES (:repo, :path, :content, :embedding)
-                """),
-                {"repo": repo_val, "path": path_val, "content": content_val, "embedding": embedding_str_val}
-            )
-        await session.commit()
+    print(f"[Indexer] Embedded {len(rows)} chunks")
+    return rows, unchanged
+
+
+async def _run_git(*args: str, env: Dict[str, str], cwd: Optional[str] = None, stdin: Optional[bytes] = None):
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=cwd,
+        env=env,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(stdin), GIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise RuntimeError(f"git {args[0]} timed out")
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {stderr.decode('utf-8', errors='ignore').strip()[-200:]}")
+
+
+async def _clone_sources(repo: str, branch: str, paths: List[str]) -> Dict[str, str]:
+    """Partial shallow clone, then check out only `paths`; return {path: source}.
     
-    # Update metadata with new commit SHA
-    file_count, chunk_count = await get_file_count_stats(repo)
-    await update_indexed_commit(repo, commit_sha, file_count, chunk_count)
+    `--filter=blob:none --depth=1 --no-checkout` transfers just the tip commit
+    and its trees; the checkout then fetches the wanted blobs in one batch.
+    Uses no REST rate-limit budget.
+    """
+    if shutil.which("git") is None:
+        raise RuntimeError("git executable not found")
+    auth = base64.b64encode(f"x-access-token:{settings.GITHUB_TOKEN}".encode()).decode()
+    # Token goes in via GIT_CONFIG_* rather than the URL, so it is not in argv or .git/config
+    env = {
+        **os.environ,
+        "GIT_TERMINAL_PROMPT": "0",
+        "GIT_LITERAL_PATHSPECS": "1",
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "http.https://github.com/.extraheader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {auth}",
+    }
+    with tempfile.TemporaryDirectory(prefix="indexer-clone-") as workdir:
+        clone_args = ["clone", "--quiet", "--filter=blob:none", "--depth=1", "--no-checkout"]
+        if branch != "HEAD":
+            clone_args += ["--branch", branch]
+        await _run_git(*clone_args, f"https://github.com/{repo}.git", workdir, env=env)
+        await _run_git(
+            "checkout", "--quiet", "HEAD", "--pathspec-from-file=-", "--pathspec-file-nul",
+            env=env, cwd=workdir, stdin="\0".join(paths).encode("utf-8")
+        )
+        return await asyncio.to_thread(_read_sources, workdir, paths)
+
+
+def _read_sources(root: str, paths: List[str]) -> Dict[str, str]:
+    sources: Dict[str, str] = {}
+    for path in paths:
+        try:
+            with open(os.path.join(root, path), "rb") as f:
+                sources[path] = f.read().decode("utf-8", errors="ignore")
+        except OSError:
+            continue
+    return sources
+
+
+async def _index_specific_files(
+    repo: str,
+    branch: str,
+    file_paths: List[str],
+    commit_sha: str,
+    file_limit: int
+) -> dict:
+    """Index only specific files (incremental mode)."""
+    # Process only changed files; "modified" files whose source is byte-identical keep their chunks
+    known_hashes = await get_content_hashes(repo, file_paths)
+    chunks_to_insert, unchanged = await _process_files(
+        get_http_client(), github_headers(), repo, file_paths[:file_limit], known_hashes
+    )
+    if unchanged:
+        print(f"[Indexer] Skipped {len(unchanged)} files with unchanged content")
+    
+    # Old chunks out, new chunks in and the commit SHA recorded atomically
+    stale_paths = set(file_paths) - unchanged
+    print()
+    print(f"[Indexer] Replacing chunks for {len(stale_paths)} files ({len(chunks_to_insert)} new chunks)...")
+    file_count, chunk_count = await replace_file_chunks(repo, stale_paths, chunks_to_insert, commit_sha)
     
     print(f"[Indexer] ✓ Incremental index complete: {len(file_paths)} files, {len(chunks_to_insert)} chunks")
     print(f"[Indexer] Total in database: {file_count} files, {chunk_count} chunks")
@@ -195,123 +361,55 @@ async def _index_all_files(repo: str, branch: str, file_limit: int) -> dict:
     This is similar to indexer_v2.py but also updates metadata tracking.
     """
     owner, name = repo.split("/", 1)
-    chunks_to_insert: List[Tuple[str, str, str, str]] = []
     
     # Fetch file tree from GitHub
-    async with httpx.AsyncClient(timeout=90) as client:
-        headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-        tree_url = f"https://api.github.com/repos/{owner}/{name}/git/trees/{branch}?recursive=1"
-        
-        print(f"[Indexer] Fetching file tree from GitHub...")
-        tree_resp = await client.get(tree_url, headers=headers)
-        if tree_resp.status_code != 200:
-            raise RuntimeError(f"Tree fetch error {tree_resp.status_code}: {tree_resp.text[:200]}")
-        
-        tree = tree_resp.json()
-        py_paths = [
-            item["path"]
-            for item in tree.get("tree", [])
-            if item.get("type") == "blob" and item["path"].endswith(".py")
-        ]
-        py_paths = py_paths[:file_limit]
-        print(f"[Indexer] Found {len(py_paths)} Python files (limit: {file_limit})")
-        print()
-        
-        # Process each file
-        for idx, path in enumerate(py_paths, 1):
-            print(f"[{idx}/{len(py_paths)}] Processing {path}...", end=" ")
-            contents_url = f"https://api.github.com/repos/{owner}/{name}/contents/{path}"
-            
-            try:
-                c_resp = await client.get(contents_url, headers=headers)
-                if c_resp.status_code != 200:
-                    print(f"✗ (fetch error {c_resp.status_code})")
-                    continue
-                
-                c_data = c_resp.json()
-                encoded = c_data.get("content")
-                if not encoded:
-                    print("✗ (no content)")
-                    continue
-                
-                raw = base64.b64decode(encoded).decode("utf-8", errors="ignore")
-                
-                # Parse with AST
-                chunks = _chunk_code_ast(raw, path)
-                if not chunks:
-                    print("✗ (no chunks)")
-                    continue
-                
-                # Generate embeddings for each chunk
-                for chunk_content in chunks:
-                    embedding = await get_embedding(chunk_content)
-                    embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
-                    
-                    if len(embedding) != settings.EMBEDDING_DIM:
-                        print(f"⚠ embedding dim={len(embedding)}, expected {settings.EMBEDDING_DIM}")
-                    
-                    chunks_to_insert.append((repo, path, chunk_content, embedding_str))
-                
-                print(f"✓ ({len(chunks)} chunks)")
-            
-            except Exception as e:
-                print(f"✗ (error: {e})")
-                continue
+    client = get_http_client()
+    headers = github_headers()
+    tree_url = f"https://api.github.com/repos/{owner}/{name}/git/trees/{branch}?recursive=1"
     
-    # Verify/recreate table if dimension mismatch (preserve existing logic)
-    async with AsyncSessionLocal() as dim_session:
+    print(f"[Indexer] Fetching file tree from GitHub...")
+    status, tree, error_text = await conditional_get_json(client, tree_url, headers)
+    if status != 200:
+        raise RuntimeError(f"Tree fetch error {status}: {error_text}")
+    
+    if tree.get("truncated"):
+        print(f"[Indexer] Warning: GitHub truncated the file tree; indexing the Python files it listed")
+    py_paths = [
+        item["path"]
+        for item in tree.get("tree", [])
+        if is_indexed_blob(item)
+    ]
+    py_paths = py_paths[:file_limit]
+    print(f"[Indexer] Found {len(py_paths)} Python files (limit: {file_limit})")
+    print()
+    
+    # One git/archive transfer instead of a contents-API request per file
+    sources = None
+    try:
+        sources = await _clone_sources(repo, branch, py_paths)
+        print(f"[Indexer] Cloned repository ({len(sources)} of {len(py_paths)} files)")
+    except Exception as e:
+        print(f"[Indexer] Git clone failed ({e}), downloading archive")
         try:
-            dim_result = await dim_session.execute(
-                text("SELECT atttypmod FROM pg_attribute WHERE attrelid = 'code_chunks'::regclass AND attname='embedding'")
-            )
-            row = dim_result.fetchone()
-            if row:
-                existing_dim = row[0]
-                if existing_dim != settings.EMBEDDING_DIM:
-                    print(f"[Indexer] Dimension mismatch: existing={existing_dim} expected={settings.EMBEDDING_DIM}. Recreating table.")
-                    await dim_session.execute(text("DROP TABLE code_chunks"))
-                    await dim_session.commit()
-                    await dim_session.execute(text(f"""
-                        CREATE TABLE code_chunks (
-                            id SERIAL PRIMARY KEY,
-                            repo TEXT NOT NULL,
-                            path TEXT NOT NULL,
-                            content TEXT NOT NULL,
-                            embedding vector({settings.EMBEDDING_DIM}),
-                            updated_at TIMESTAMPTZ DEFAULT NOW()
-                        );
-                    """))
-                    await dim_session.commit()
-            else:
-                await dim_session.execute(text(f"""
-                    CREATE TABLE IF NOT EXISTS code_chunks (
-                        id SERIAL PRIMARY KEY,
-                        repo TEXT NOT NULL,
-                        path TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding vector({settings.EMBEDDING_DIM}),
-                        updated_at TIMESTAMPTZ DEFAULT NOW()
-                    );
-                """))
-                await dim_session.commit()
+            sources = await _download_sources(client, headers, repo, branch, py_paths)
+            print(f"[Indexer] Downloaded repository archive ({len(sources)} of {len(py_paths)} files)")
         except Exception as e:
-            print(f"[Indexer] Warning: dimension check failed ({e})")
-            await dim_session.rollback()
-    
+            print(f"[Indexer] Tarball download failed ({e}), fetching files individually")
+    if sources is None:
+        chunks_to_insert, _ = await _process_files(client, headers, repo, py_paths)
+    else:
+        chunks_to_insert, _ = await _process_sources(repo, py_paths, sources)
+
     # Bulk insert into database
     print()
     print(f"[Indexer] Inserting {len(chunks_to_insert)} chunks into pgvector table...")
-    
-    async with AsyncSessionLocal() as session:
-        for repo_val, path_val, content_val, embedding_str_val in chunks_to_insert:
-            await session.execute(
-                text("""
-                    INSERT INTO code_chunks (repo, path, content, embedding) 
-                    VALUES (:repo, :path, :content, :embedding)
-                """),
-                {"repo": repo_val, "path": path_val, "content": content_val, "embedding": embedding_str_val}
-            )
-        await session.commit()
+    # HNSW is built once over the loaded rows instead of maintained per row
+    await drop_vector_index()
+    try:
+        await insert_chunks(chunks_to_insert)
+    finally:
+        print(f"[Indexer] Rebuilding vector index...")
+        await build_vector_index()
     
     # Get current commit SHA and update metadata
     try:
@@ -1,24 +1,200 @@
 """AST-based GitHub repository indexer with intelligent chunking."""
 from __future__ import annotations
 import ast
-import base64
+import asyncio
+import os
+import re
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import httpx
-from typing import List, Tuple
-from sqlalchemy import text
+import numpy as np
+import orjson
+from typing import IO, AsyncIterator, Dict, List, Optional, Tuple
 from app.config import settings
-from app.llm.embeddings import get_embedding
-from app.db.session import AsyncSessionLocal
+from app.llm.embeddings import get_embeddings_batch_with_source, to_storage_dtype
+from app.utils.http import get_http_client, github_headers
 from app.utils.logger import get_indexer_logger
+from app.vector.incremental import (
+    ensure_metadata_table,
+    is_indexed_blob,
+    chunk_loader,
+    drop_vector_index,
+    build_vector_index,
+    chunk_cache_key,
+    get_cached_embeddings,
+    store_cached_embeddings
+)
+
+try:
+    from tree_sitter_languages import get_parser as _get_ts_parser
+    TREE_SITTER_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    TREE_SITTER_AVAILABLE = False
 
 logger = get_indexer_logger()
 
+# Concurrent contents-API requests per indexing run (GitHub secondary rate limits)
+FETCH_CONCURRENCY = 16
+# Repository archives up to this size are buffered in memory, larger ones on disk
+TARBALL_SPOOL_BYTES = 64 * 1024 * 1024
+# Files handed to the AST process pool at a time (one per worker process)
+CHUNK_WINDOW = os.cpu_count() or 4
+# Chunks per provider request (Gemini batchEmbedContents maximum) and requests in flight
+EMBED_BATCH_SIZE = 100
+EMBED_CONCURRENCY = 4
+# Embedded rows buffered ahead of the inserter, and rows per COPY
+INSERT_QUEUE_SIZE = 1000
+INSERT_BATCH_SIZE = 500
+
+# (repo, path, content, embedding, content_hash) as stored in code_chunks
+ChunkRow = Tuple[str, str, str, np.ndarray, Optional[bytes]]
+
+_ast_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_ast_pool() -> ProcessPoolExecutor:
+    """Process pool for AST chunking (pure-Python CPU work, so threads would serialize on the GIL)."""
+    global _ast_pool
+    if _ast_pool is None:
+        _ast_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _ast_pool
+
+
+def shutdown_ast_pool() -> None:
+    global _ast_pool
+    if _ast_pool is not None:
+        _ast_pool.shutdown(cancel_futures=True)
+        _ast_pool = None
+
+
+async def chunk_code_in_pool(code: str, filepath: str) -> List[str]:
+    """_chunk_code_ast in the AST process pool, leaving the event loop free."""
+    return await asyncio.get_running_loop().run_in_executor(get_ast_pool(), _chunk_code_ast, code, filepath)
+
+
+async def _fetch_file(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    headers: dict,
+    repo: str,
+    path: str
+) -> Tuple[Optional[str], Optional[str]]:
+    """Fetch one file via the contents API; returns (source, None) or (None, reason)."""
+    contents_url = f"https://api.github.com/repos/{repo}/contents/{path}"
+    # The raw media type returns the file body itself instead of base64 inside JSON
+    raw_headers = {**headers, "Accept": "application/vnd.github.raw"}
+    try:
+        async with semaphore:
+            c_resp = await client.get(contents_url, headers=raw_headers)
+        if c_resp.status_code != 200:
+            return None, f"fetch error {c_resp.status_code}"
+        
+        if not c_resp.content:
+            return None, "no content"
+        
+        return c_resp.content.decode("utf-8", errors="ignore"), None
+    except Exception as e:
+        return None, f"error: {e}"
+
+
+async def _download_sources(
+    client: httpx.AsyncClient,
+    headers: dict,
+    repo: str,
+    branch: str,
+    paths: List[str]
+) -> Dict[str, str]:
+    """Download the repository tarball once and return {path: source} for `paths`."""
+    tarball_url = f"https://api.github.com/repos/{repo}/tarball/{branch}"
+    with tempfile.SpooledTemporaryFile(max_size=TARBALL_SPOOL_BYTES) as spool:
+        # The API answers with a redirect to codeload.github.com
+        async with client.stream("GET", tarball_url, headers=headers, follow_redirects=True) as resp:
+            if resp.status_code != 200:
+                raise RuntimeError(f"Tarball fetch error {resp.status_code}")
+            async for block in resp.aiter_bytes():
+                spool.write(block)
+        spool.seek(0)
+        return await asyncio.to_thread(_extract_sources, spool, set(paths))
+
+
+def _extract_sources(fileobj: IO[bytes], wanted: set) -> Dict[str, str]:
+    sources: Dict[str, str] = {}
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            # Members sit under a single "<owner>-<name>-<sha>/" directory
+            path = member.name.split("/", 1)[-1]
+            if path in wanted:
+                data = archive.extractfile(member).read()
+                sources[path] = data.decode("utf-8", errors="ignore")
+    return sources
+
+
+async def _embed_with_cache(chunks: List[str]) -> np.ndarray:
+    """Embed chunks, reusing vectors cached for identical chunk text (boilerplate repeats across files)."""
+    keys = [chunk_cache_key(chunk) for chunk in chunks]
+    cached = await get_cached_embeddings(keys)
+    embeddings = np.zeros((len(chunks), settings.EMBEDDING_DIM), dtype=np.float32)
+    misses = []
+    for i, key in enumerate(keys):
+        if key in cached:
+            embeddings[i] = cached[key]
+        else:
+            misses.append(i)
+    
+    if misses:
+        fresh, remote = await get_embeddings_batch_with_source([chunks[i] for i in misses])
+        embeddings[misses] = fresh
+        # Only provider vectors are cached; hash fallbacks would otherwise stick
+        await store_cached_embeddings(
+            [(keys[i], to_storage_dtype(fresh[pos])) for pos, i in enumerate(misses) if remote[pos]]
+        )
+    return to_storage_dtype(embeddings)
+
+
+async def _insert_from_queue(row_q: asyncio.Queue) -> int:
+    """Consume rows until a None sentinel, COPYing every INSERT_BATCH_SIZE of them.
+    
+    All batches share one transaction that commits at the sentinel, so a run
+    that fails partway leaves no rows behind and readers never see a partial load.
+    """
+    batch: List[ChunkRow] = []
+    inserted = 0
+    error: Optional[Exception] = None
+    async with chunk_loader() as load:
+        while True:
+            row = await row_q.get()
+            if row is not None:
+                batch.append(row)
+            if batch and (row is None or len(batch) >= INSERT_BATCH_SIZE):
+                # After a failure keep draining so producers never block on a full queue
+                if error is None:
+                    try:
+                        await load(batch)
+                        inserted += len(batch)
+                    except Exception as e:
+                        error = e
+                batch = []
+            if row is None:
+                break
+        if error is not None:
+            raise error  # rolls back every batch
+    return inserted
+
 
 async def index_github_repo_ast(
     repo: str | None = None, 
     branch: str = "HEAD", 
     file_limit: int = 150
 ) -> None:
-    """Index GitHub repository using AST parsing for intelligent chunking."""
+    """Index GitHub repository using AST parsing for intelligent chunking.
+    
+    Fetching, embedding and inserting overlap: embedded rows go through a
+    bounded queue to a COPY consumer, so memory stays O(batch) not O(repo).
+    """
     repo = repo or settings.github_repo_name
     
     if not settings.GITHUB_TOKEN:
@@ -29,127 +205,146 @@ async def index_github_repo_ast(
     logger.info(f"Starting indexing for repo: {repo}")
     logger.info(f"Embedding config: {settings.EMBEDDING_PROVIDER}/{settings.EMBEDDING_MODEL} ({settings.EMBEDDING_DIM}D)")
     
+    # code_chunks itself comes from ensure_code_chunks_schema() (startup / run_indexer.py)
+    await ensure_metadata_table()  # includes chunk_embedding_cache
+    
     owner, name = repo.split("/", 1)
-    chunks_to_insert: List[Tuple[str, str, str, str]] = []
+    client = get_http_client()
+    headers = github_headers()
+    tree_url = f"https://api.github.com/repos/{owner}/{name}/git/trees/{branch}?recursive=1"
+    
+    logger.info("Fetching file tree from GitHub...")
+    tree_resp = await client.get(tree_url, headers=headers)
+    if tree_resp.status_code != 200:
+        raise RuntimeError(f"Tree fetch error {tree_resp.status_code}: {tree_resp.text[:200]}")
+    
+    tree = orjson.loads(tree_resp.content)
+    py_paths = [
+        item["path"] 
+        for item in tree.get("tree", []) 
+        if is_indexed_blob(item)
+    ]
+    py_paths = py_paths[:file_limit]
+    total = len(py_paths)
+    logger.info(f"Found {total} Python files (limit: {file_limit})")
+    if not py_paths:
+        logger.warning("No Python files to index")
+        return
+    
+    row_q: asyncio.Queue = asyncio.Queue(maxsize=INSERT_QUEUE_SIZE)
+    inserter = asyncio.create_task(_insert_from_queue(row_q))
+    embed_slots = asyncio.Semaphore(EMBED_CONCURRENCY)
+    embed_tasks: List[asyncio.Task] = []
+    
+    async def embed_and_queue(batch: List[Tuple[str, str]]):
+        try:
+            embeddings = await _embed_with_cache([chunk for _, chunk in batch])
+        finally:
+            embed_slots.release()
+        for (path, chunk_content), embedding in zip(batch, embeddings):
+            await row_q.put((repo, path, chunk_content, embedding, None))
+    
+    async def flush(batch: List[Tuple[str, str]]):
+        # Waiting for a free slot throttles fetching to the embedding rate
+        await embed_slots.acquire()
+        embed_tasks.append(asyncio.create_task(embed_and_queue(batch)))
     
-    async with httpx.AsyncClient(timeout=90) as client:
-        headers = {"Authorization": f"Bearer {settings.GITHUB_TOKEN}"}
-        tree_url = f"https://api.github.com/repos/{owner}/{name}/git/trees/{branch}?recursive=1"
+    # (path, chunk) not yet sent for embedding
+    pending: List[Tuple[str, str]] = []
+    
+    try:
+        async def from_archive(sources: Dict[str, str]) -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+            for path in py_paths:
+                raw = sources.get(path)
+                yield path, raw, None if raw is not None else "not in archive"
         
-        logger.info("Fetching file tree from GitHub...")
-        tree_resp = await client.get(tree_url, headers=headers)
-        if tree_resp.status_code != 200:
-            raise RuntimeError(f"Tree fetch error {tree_resp.status_code}: {tree_resp.text[:200]}")
+        async def from_contents_api() -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
+            semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+            
+            async def fetch_one(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+                raw, error = await _fetch_file(client, semaphore, headers, repo, path)
+                return path, raw, error
+            
+            # Requests overlap; files are chunked in completion order
+            for next_done in asyncio.as_completed([fetch_one(p) for p in py_paths]):
+                yield await next_done
         
-        tree = tree_resp.json()
-        py_paths = [
-            item["path"] 
-            for item in tree.get("tree", []) 
-            if item.get("type") == "blob" and item["path"].endswith(".py")
-        ]
-        py_paths = py_paths[:file_limit]
-        logger.info(f"Found {len(py_paths)} Python files (limit: {file_limit})")
+        # One archive download instead of a contents-API request per file
+        try:
+            sources = await _download_sources(client, headers, repo, branch, py_paths)
+            logger.info(f"Downloaded repository archive ({len(sources)} of {total} files)")
+            files = from_archive(sources)
+        except Exception as e:
+            logger.warning(f"Tarball download failed ({e}), fetching files individually")
+            files = from_contents_api()
         
-        for idx, path in enumerate(py_paths, 1):
-            contents_url = f"https://api.github.com/repos/{owner}/{name}/contents/{path}"
-            
+        # HNSW is built once over the loaded rows (in finally) instead of maintained per row;
+        # dropped only now so failed fetches leave the live index alone
+        await drop_vector_index()
+        
+        async def chunk_one(path: str, raw: Optional[str], error: Optional[str]):
+            if error:
+                return None, error
             try:
-                c_resp = await client.get(contents_url, headers=headers)
-                if c_resp.status_code != 200:
-                    logger.warning(f"[{idx}/{len(py_paths)}] {path} - Fetch error {c_resp.status_code}")
-                    continue
-                
-                c_data = c_resp.json()
-                encoded = c_data.get("content")
-                if not encoded:
-                    logger.warning(f"[{idx}/{len(py_paths)}] {path} - No content")
+                # ast.parse is CPU-bound; the pool parses CHUNK_WINDOW files in parallel
+                return await chunk_code_in_pool(raw, path), None
+            except Exception as e:
+                return None, f"Error: {e}"
+        
+        idx = 0
+        width = len(str(total))
+        
+        async def chunk_window(window: List[Tuple[str, Optional[str], Optional[str]]]):
+            nonlocal idx, pending
+            results = await asyncio.gather(*(chunk_one(*item) for item in window))
+            for (path, _, _), (chunks, error) in zip(window, results):
+                idx += 1
+                prefix = f"[{idx:{width}d}/{total}]"
+                if error:
+                    logger.warning(f"{prefix} {path} - {error}")
                     continue
-                
-                raw = base64.b64decode(encoded).decode("utf-8", errors="ignore")
-                
-                chunks = _chunk_code_ast(raw, path)
                 if not chunks:
-                    logger.warning(f"[{idx}/{len(py_paths)}] {path} - No chunks extracted")
+                    logger.warning(f"{prefix} {path} - No chunks extracted")
                     continue
                 
-                for chunk_content in chunks:
-                    embedding = await get_embedding(chunk_content)
-                    
-                    embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
-                    
-                    if len(embedding) != settings.EMBEDDING_DIM:
-                        logger.warning(f"[{idx}/{len(py_paths)}] {path} - Embedding dim={len(embedding)}, expected {settings.EMBEDDING_DIM}")
-                    
-                    chunks_to_insert.append((repo, path, chunk_content, embedding_str))
-                
-                logger.info(f"[{idx}/{len(py_paths)}] {path} - {len(chunks)} chunks processed")
-            
-            except Exception as e:
-                logger.error(f"[{idx}/{len(py_paths)}] {path} - Error: {e}")
-                continue
+                pending.extend((path, chunk_content) for chunk_content in chunks)
+                logger.info(f"{prefix} {path} - {len(chunks)} chunks extracted")
+                while len(pending) >= EMBED_BATCH_SIZE:
+                    await flush(pending[:EMBED_BATCH_SIZE])
+                    pending = pending[EMBED_BATCH_SIZE:]
+        
+        window: List[Tuple[str, Optional[str], Optional[str]]] = []
+        async for item in files:
+            window.append(item)
+            if len(window) >= CHUNK_WINDOW:
+                await chunk_window(window)
+                window = []
+        if window:
+            await chunk_window(window)
+        
+        if pending:
+            await flush(pending)
+        await asyncio.gather(*embed_tasks)
+        await row_q.put(None)
+        inserted = await inserter
+    except BaseException:
+        # Cancelling the consumer rolls back everything it loaded
+        for task in embed_tasks:
+            task.cancel()
+        inserter.cancel()
+        await asyncio.gather(*embed_tasks, inserter, return_exceptions=True)
+        raise
+    finally:
+        await build_vector_index()
     
-    # Verify code_chunks table embedding dimension matches current setting; recreate if mismatch
-    async with AsyncSessionLocal() as dim_session:
-        try:
-            dim_result = await dim_session.execute(
-                text("SELECT atttypmod FROM pg_attribute WHERE attrelid = 'code_chunks'::regclass AND attname='embedding'")
-            )
-            row = dim_result.fetchone()
-            if row:
-                existing_dim = row[0]  # pgvector stores dimension directly in typmod
-                if existing_dim != settings.EMBEDDING_DIM:
-                    logger.warning(f"Dimension mismatch: existing={existing_dim} expected={settings.EMBEDDING_DIM}. Recreating table.")
-                    await dim_session.execute(text("DROP TABLE code_chunks"))
-                    await dim_session.commit()
-                    await dim_session.execute(text(f"""
-                        CREATE TABLE code_chunks (
-                            id SERIAL PRIMARY KEY,
-                            repo TEXT NOT NULL,
-                            path TEXT NOT NULL,
-                            content TEXT NOT NULL,
-                            embedding vector({settings.EMBEDDING_DIM}),
-                            updated_at TIMESTAMPTZ DEFAULT NOW()
-                        );
-                    """))
-                    await dim_session.commit()
-            else:
-                # Table might not exist yet
-                await dim_session.execute(text(f"""
-                    CREATE TABLE IF NOT EXISTS code_chunks (
-                        id SERIAL PRIMARY KEY,
-                        repo TEXT NOT NULL,
-                        path TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding vector({settings.EMBEDDING_DIM}),
-                        updated_at TIMESTAMPTZ DEFAULT NOW()
-                    );
-                """))
-                await dim_session.commit()
-        except Exception as e:
-            logger.error(f"Dimension check failed: {e}")
-            await dim_session.rollback()
-
-    logger.info(f"Inserting {len(chunks_to_insert)} chunks into pgvector table...")
-    
-    async with AsyncSessionLocal() as session:
-        for repo_val, path_val, content_val, embedding_str_val in chunks_to_insert:
-            await session.execute(
-                text(
-                    """
-                    INSERT INTO code_chunks (repo, path, content, embedding) 
-                    VALUES (:repo, :path, :content, :embedding)
-                    """
-                ),
-                {
-                    "repo": repo_val,
-                    "path": path_val,
-                    "content": content_val,
-                    "embedding": embedding_str_val
-                },
-            )
-        await session.commit()
-    
-    logger.info(f"Successfully indexed {len(chunks_to_insert)} code chunks")
+    logger.info(f"Successfully indexed {inserted} code chunks")
+
+
+_DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+# Line breaks as the tokenizer sees them (str.splitlines also splits on \f, \x1c, \u2028, ...)
+_LINE_BREAK_RE = re.compile(r"(?<=\n)|(?<=\r)(?!\n)")
+# Definition starts for files that do not parse
+_PY_FUNC_RE = re.compile(r"^(?:def|class)\s+\w+.*:", re.MULTILINE)
 
 
 def _chunk_code_ast(code: str, filepath: str) -> List[str]:
@@ -158,21 +353,15 @@ def _chunk_code_ast(code: str, filepath: str) -> List[str]:
     
     try:
         tree = ast.parse(code)
+        # Split once; ast.get_source_segment re-splits the whole file per node
+        lines = _LINE_BREAK_RE.split(code)
         
-        for node in ast.walk(tree):
-            # Extract functions (only top-level, not nested)
-            if isinstance(node, ast.FunctionDef):
-                if _is_top_level(node, tree):
-                    chunk = ast.get_source_segment(code, node)
-                    if chunk:
-                        chunks.append(_truncate(chunk, 4000))
-            
-            # Extract classes (with methods included)
-            elif isinstance(node, ast.ClassDef):
-                if _is_top_level(node, tree):
-                    chunk = ast.get_source_segment(code, node)
-                    if chunk:
-                        chunks.append(_truncate(chunk, 4000))
+        # Top-level definitions are exactly tree.body; classes carry their methods
+        for node in tree.body:
+            if isinstance(node, _DEFINITION_NODES):
+                chunk = "".join(lines[node.lineno - 1:node.end_lineno]).rstrip()
+                if chunk:
+                    chunks.append(_truncate(chunk, 4000))
         
         # If no top-level definitions found, chunk by size
         if not chunks:
@@ -181,28 +370,46 @@ def _chunk_code_ast(code: str, filepath: str) -> List[str]:
         return chunks
     
     except SyntaxError:
-        # Fallback: regex-based chunking for malformed files
-        return _chunk_code_regex(code)
+        # Fallback for malformed files: error-tolerant tree-sitter parse, else regex
+        chunks = _chunk_code_tree_sitter(code) if TREE_SITTER_AVAILABLE else None
+        return chunks or _chunk_code_regex(code)
+
+
+_TS_DEFINITION_TYPES = frozenset({"function_definition", "class_definition", "decorated_definition"})
+
 
+@lru_cache(maxsize=1)
+def _ts_parser():
+    """Python tree-sitter parser, created lazily in each AST pool process."""
+    return _get_ts_parser("python")
 
-def _is_top_level(node: ast.AST, tree: ast.Module) -> bool:
-    """Check if node is a top-level definition."""
-    for item in tree.body:
-        if item == node:
-            return True
-        # Check if node is a direct child method of a top-level class
-        if isinstance(item, ast.ClassDef):
-            for child in item.body:
-                if child == node:
-                    return True
-    return False
+
+def _chunk_code_tree_sitter(code: str) -> Optional[List[str]]:
+    """Top-level def/class spans from tree-sitter, which recovers from syntax errors.
+    
+    Returns None if the parser cannot be loaded (e.g. incompatible tree_sitter build).
+    """
+    try:
+        parser = _ts_parser()
+    except Exception:
+        return None
+    source = code.encode("utf-8")
+    # Definitions after a syntax error can end up inside top-level ERROR nodes
+    nodes = []
+    for node in parser.parse(source).root_node.children:
+        nodes.extend(node.children if node.type == "ERROR" else (node,))
+    chunks = []
+    for node in nodes:
+        if node.type in _TS_DEFINITION_TYPES:
+            chunk = source[node.start_byte:node.end_byte].decode("utf-8", errors="ignore").rstrip()
+            if chunk:
+                chunks.append(_truncate(chunk, 4000))
+    return chunks
 
 
 def _chunk_code_regex(code: str) -> List[str]:
     """Fallback regex-based chunking (original logic for malformed Python files)."""
-    import re
-    PY_FUNC_RE = re.compile(r"^(def|class)\s+\w+.*:", re.MULTILINE)
-    matches = list(PY_FUNC_RE.finditer(code))
+    matches = list(_PY_FUNC_RE.finditer(code))
     if not matches:
         return _slice_large(code)
     
@@ -21,7 +21,10 @@ Options:
 """
 import asyncio
 import sys
+from app.db.schema import ensure_code_chunks_schema
 from app.vector.indexer_smart import index_github_repo_smart
+from app.vector.indexer_v2 import shutdown_ast_pool
+from app.utils.http import close_http_client
 
 async def main():
     # Check for --full flag
@@ -47,6 +50,7 @@ async def main():
     print()
     
     try:
+        await ensure_code_chunks_schema()
         stats = await index_github_repo_smart(force_full=force_full)
         print()
         print("="*80)
@@ -87,6 +91,9 @@ async def main():
         print("To force full re-index: python run_indexer.py --full")
         import traceback
         traceback.print_exc()
+    finally:
+        await close_http_client()
+        shutdown_ast_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())